@@ -2,8 +2,13 @@ import dash
 import dash_bootstrap_components as dbc
 from dash import dcc, html, Input, Output
 import plotly.express as px
+import plotly.graph_objects as go
+import numpy as np
 import pandas as pd
 
+from healthcare.bitmap import BitmapIndex
+from healthcare.histogram import BinnedDistribution
+
 
 def load_data():
     # Load and preprocess the data
@@ -16,6 +21,16 @@ def load_data():
 
 df = load_data()
 
+# Equality filters on the categorical columns are answered from bitmaps, and
+# the callbacks fired by one dropdown change share the filtered subset
+index = BitmapIndex(df)
+
+# Age and billing values sorted per gender; the histograms are binned on the
+# server and sent as a few bars instead of every row
+ages = BinnedDistribution.from_frame(df, 'Age', by='Gender')
+billing = BinnedDistribution.from_frame(df, 'Billing Amount', by='Gender')
+GENDER_COLORS = ["#636EFA", "#EF553B"]
+
 # Calculate summary statistics
 num_records = len(df)
 avg_billing = df['Billing Amount'].mean()
@@ -120,6 +135,17 @@ app.layout = dbc.Container([
 ], fluid=True)
 
 
+def histogram_bars(edges, counts, label, name=None, color="#636EFA"):
+    # One bar per [edges[i], edges[i + 1]) bin, drawn like a px.histogram bar
+    width = edges[1] - edges[0] if len(edges) > 1 else None
+    return go.Bar(
+        x=edges[:-1] + width / 2 if width else [], y=counts, width=width, name=name, marker_color=color,
+        customdata=np.column_stack([edges[:-1], edges[1:]]) if width else None,
+        hovertemplate=f"{label}=%{{customdata[0]:,}}-%{{customdata[1]:,}}<br>count=%{{y}}<extra></extra>",
+        showlegend=name is not None,
+    )
+
+
 # Callbacks for interactivity
 
 @app.callback(
@@ -127,26 +153,21 @@ app.layout = dbc.Container([
     Input('gender-filter', 'value')
 )
 def update_age_distribution(selected_gender):
-    # Filter the dataframe based on the selected gender
-    if selected_gender:
-        filtered_df = df[df['Gender'] == selected_gender]
-    else:
-        filtered_df = df
+    # Bins span the selected gender, or every gender when none is selected
+    edges = ages.edges(selected_gender)
 
-    # Check if the filtered dataframe is not empty
-    if filtered_df.empty:
+    # Check if the filtered data is not empty
+    if not len(edges):
         return {}
 
-    # Create the histogram
-    fig = px.histogram(
-        filtered_df,
-        x="Age",
-        nbins=10,
-        color="Gender",
-        title="Age Distribution by Gender",
-        color_discrete_sequence=["#636EFA", "#EF553B"]
-    )
-
+    genders = [selected_gender] if selected_gender else list(ages.groups)
+    fig = go.Figure([
+        histogram_bars(edges, ages.counts(edges, gender), "Age", name=str(gender),
+                       color=GENDER_COLORS[i % len(GENDER_COLORS)])
+        for i, gender in enumerate(genders)
+    ])
+    fig.update_layout(title="Age Distribution by Gender", barmode="stack", legend_title_text="Gender",
+                      xaxis_title="Age", yaxis_title="count")
     return fig
 
 
@@ -155,7 +176,7 @@ def update_age_distribution(selected_gender):
     Input('gender-filter', 'value')
 )
 def update_condition_distribution(selected_gender):
-    filtered_df = df[df['Gender'] == selected_gender] if selected_gender else df
+    filtered_df = index.subset({'Gender': selected_gender})
     fig = px.pie(filtered_df, names="Medical Condition", title="Medical Condition Distribution")
     return fig
 
@@ -166,7 +187,7 @@ def update_condition_distribution(selected_gender):
      Input('condition-filter', 'value')]
 )
 def update_admission_trends(chart_type, selected_condition):
-    filtered_df = df[df['Medical Condition'] == selected_condition] if selected_condition else df
+    filtered_df = index.subset({'Medical Condition': selected_condition})
 
     # Group by YearMonth and convert to string
     trend_df = filtered_df.groupby('YearMonth').size().reset_index(name='Count')
@@ -186,9 +207,10 @@ def update_admission_trends(chart_type, selected_condition):
      Input('billing-slider', 'value')]
 )
 def update_billing_distribution(selected_gender, slider_value):
-    filtered_df = df[df['Gender'] == selected_gender] if selected_gender else df
-    filtered_df = filtered_df[filtered_df['Billing Amount'] <= slider_value]
-    fig = px.histogram(filtered_df, x="Billing Amount", nbins=10, title="Billing Amount Distribution")
+    edges = billing.edges(selected_gender, upper=slider_value)
+    counts = billing.counts(edges, selected_gender, upper=slider_value)
+    fig = go.Figure(histogram_bars(edges, counts, "Billing Amount"))
+    fig.update_layout(title="Billing Amount Distribution", xaxis_title="Billing Amount", yaxis_title="count")
     return fig
 
 
@@ -197,7 +219,7 @@ def update_billing_distribution(selected_gender, slider_value):
     Input('gender-filter', 'value')
 )
 def update_insurance_comparison(selected_gender):
-    filtered_df = df[df['Gender'] == selected_gender] if selected_gender else df
+    filtered_df = index.subset({'Gender': selected_gender})
     fig = px.bar(
         filtered_df, x="Insurance Provider", y="Billing Amount", color="Medical Condition", barmode="group",
         title="Insurance Provider Billing Comparison",
@@ -1,7 +1,15 @@
+import os
+
 import dash
 from dash import dcc, html
 import dash_bootstrap_components as dbc
 
+from healthcare.figure_cache import install_figure_cache
+from healthcare.metrics import install_metrics
+from healthcare.payload import install_compression
+from healthcare.prewarm import install_prewarm, prewarmer
+from healthcare.watcher import start_watcher
+
 app = dash.Dash(
     __name__,
     use_pages=True,
@@ -10,6 +18,18 @@ app = dash.Dash(
 
 app.title = "Health Care Dashboard"
 
+# Cached callback outputs are sent as the JSON they were stored as
+install_figure_cache(app)
+
+# Per-callback and per-page timings, response sizes and errors at /metrics
+install_metrics(app)
+
+# Compact figures are further gzip/brotli-compressed on the wire
+install_compression(app)
+
+# Page figures are rebuilt in the background after data changes; status at /prewarm
+install_prewarm(app)
+
 # Your app layout and callbacks here
 app.layout = dbc.Container([
     dbc.NavbarSimple(
@@ -27,4 +47,11 @@ app.layout = dbc.Container([
 ], fluid=True)
 
 if __name__ == "__main__":
-    app.run_server(debug=True)
\ No newline at end of file
+    # Development server; for production use `gunicorn -c gunicorn.conf.py`,
+    # which preloads the data once and forks workers (see wsgi.py).
+    # Pick up admissions appended to the data file; with the debug reloader the
+    # server runs in a child process, so only watch from there
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        prewarmer.schedule(everything=True)
+        start_watcher()
+    app.run_server(debug=True)
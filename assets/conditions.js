@@ -0,0 +1,10 @@
+// Tooltip formatter for the admission-month range slider on the medical
+// condition page: months are numbered year * 12 + month - 1
+(function () {
+    var MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"];
+
+    window.dccFunctions = window.dccFunctions || {};
+    window.dccFunctions.monthLabel = function (month) {
+        return MONTHS[month % 12] + " " + Math.floor(month / 12);
+    };
+})();
@@ -0,0 +1,32 @@
+// Clientside callbacks for the overview page (pages/overview.py)
+(function () {
+    function withData(figure, x, y) {
+        var trace = Object.assign({}, figure.data[0], {x: x, y: y});
+        return Object.assign({}, figure, {data: [trace]});
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        overview: {
+            // Redraw the year-range charts from the per-year totals in
+            // year-totals-store, mirroring update_graphs on the server
+            updateGraphs: function (yearRange, store) {
+                if (!store || !yearRange) {
+                    return [window.dash_clientside.no_update, window.dash_clientside.no_update];
+                }
+                var years = [];
+                var admissions = [];
+                var avgBilling = [];
+                for (var i = 0; i < store.years.length; i++) {
+                    var year = store.years[i];
+                    if (year < yearRange[0] || year > yearRange[1] || store.counts[i] === 0) {
+                        continue;
+                    }
+                    years.push(String(year));
+                    admissions.push(store.counts[i]);
+                    avgBilling.push(store.billing_counts[i] ? store.billing_sums[i] / store.billing_counts[i] : null);
+                }
+                return [withData(store.bar, years, admissions), withData(store.line, years, avgBilling)];
+            }
+        }
+    });
+})();
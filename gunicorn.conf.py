@@ -0,0 +1,26 @@
+# Production serving: gunicorn -c gunicorn.conf.py
+#
+# The app is imported once in the master (preload_app), which loads the
+# dataset and builds the page figures (wsgi.py), then forks the workers; they
+# share that memory copy-on-write. `kill -HUP <master pid>` replaces the
+# workers gracefully, each new one forked from the preloaded master.
+import multiprocessing
+import os
+
+wsgi_app = "wsgi:server"
+preload_app = True
+
+bind = os.environ.get("HEALTHCARE_BIND", "0.0.0.0:8050")
+workers = int(os.environ.get("HEALTHCARE_WORKERS", multiprocessing.cpu_count()))
+threads = int(os.environ.get("HEALTHCARE_THREADS", 4))
+worker_class = "gthread"
+timeout = int(os.environ.get("HEALTHCARE_TIMEOUT", 60))
+graceful_timeout = int(os.environ.get("HEALTHCARE_GRACEFUL_TIMEOUT", 30))
+
+
+def post_fork(server, worker):
+    # Threads do not survive fork: each worker starts its own data file
+    # watcher, which picks up rows appended since the master loaded the file
+    from healthcare.watcher import start_watcher
+
+    start_watcher()
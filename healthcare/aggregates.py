@@ -0,0 +1,671 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from healthcare import dataset
+from healthcare.sketches import HeavyHitters, QuantileHistogram
+from healthcare.store import SQLITE_BACKEND, TABLE, get_store, quote_name
+
+# Count tables kept for the insurance and blood type pages, keyed by their
+# group-by columns
+GROUP_COUNTS = [
+    ('Insurance Provider',),
+    ('Blood Type',),
+    ('Medical Condition',),
+    ('Age Group', 'Insurance Provider'),
+    ('Blood Type', 'Age Group'),
+    ('Blood Type', 'Length of Stay (Days)'),
+]
+
+# (item, breakdown) columns with too many items to count and plot in full; each
+# keeps a bounded top-K summary of the busiest items instead of a count table
+HEAVY_HITTERS = [
+    ('Doctor', 'Blood Type'),
+    ('Hospital', 'Blood Type'),
+    ('Hospital', 'Insurance Provider'),
+]
+
+# Items tracked per heavy-hitter summary; also the largest K the pages may ask for
+HEAVY_HITTERS_CAPACITY = int(os.environ.get("HEALTHCARE_HEAVY_HITTERS_CAPACITY", 1000))
+
+# K values offered by the top-K selectors
+TOP_K_CHOICES = [5, 10, 20, 50]
+DEFAULT_TOP_K = 10
+
+# Columns whose full set of levels is known up front; count tables over them
+# can be completed with zero rows the way groupby(observed=False) does
+KNOWN_LEVELS = {'Age Group': dataset.AGE_LABELS}
+
+# Aggregates are streamed from the CSV when HEALTHCARE_CHUNKSIZE is set
+CHUNKSIZE = dataset.CHUNKSIZE
+
+
+class YearCube:
+    # Per-year admission counts and billing sums with prefix sums over the
+    # year axis. Built once per dataset; any inclusive year range is answered
+    # in O(number of years) instead of rescanning the rows.
+
+    def __init__(self, years, billing):
+        years = np.asarray(years, dtype=float)
+        billing = np.asarray(billing, dtype=float)
+        valid = ~np.isnan(years)
+        years = years[valid].astype(np.int64)
+        billing = billing[valid]
+
+        first_year = int(years.min()) if len(years) else 0
+        size = int(years.max()) - first_year + 1 if len(years) else 0
+        offsets = years - first_year
+
+        has_billing = ~np.isnan(billing)
+        counts = np.bincount(offsets, minlength=size)
+        billing_counts = np.bincount(offsets[has_billing], minlength=size)
+        billing_sums = np.bincount(offsets[has_billing], weights=billing[has_billing], minlength=size)
+        self._set(first_year, counts, billing_counts, billing_sums)
+
+    def _set(self, first_year, counts, billing_counts, billing_sums):
+        self.first_year = first_year
+        self.last_year = first_year + len(counts) - 1 if len(counts) else first_year
+        self.counts = counts
+        self.billing_counts = billing_counts
+        self.billing_sums = billing_sums
+
+        self.years = np.arange(first_year, first_year + len(counts))
+        self.count_prefix = np.concatenate([[0], np.cumsum(counts)])
+        self.billing_count_prefix = np.concatenate([[0], np.cumsum(billing_counts)])
+        self.billing_sum_prefix = np.concatenate([[0.0], np.cumsum(billing_sums)])
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls(df['Date of Admission'].dt.year, df['Billing Amount'])
+
+    @classmethod
+    def from_totals(cls, years, counts, billing_counts, billing_sums):
+        # Cube from per-year totals computed elsewhere (e.g. in SQL)
+        years = np.asarray(years, dtype=np.int64)
+        first_year = int(years.min()) if len(years) else 0
+        size = int(years.max()) - first_year + 1 if len(years) else 0
+        arrays = []
+        for values, dtype in ((counts, np.int64), (billing_counts, np.int64), (billing_sums, float)):
+            dense = np.zeros(size, dtype=dtype)
+            dense[years - first_year] = values
+            arrays.append(dense)
+        cube = cls.__new__(cls)
+        cube._set(first_year, *arrays)
+        return cube
+
+    def merge(self, other):
+        # New cube holding the per-year totals of both cubes
+        if not len(other.counts):
+            return self
+        if not len(self.counts):
+            return other
+        first_year = min(self.first_year, other.first_year)
+        size = max(self.last_year, other.last_year) - first_year + 1
+        arrays = []
+        for name, dtype in (('counts', np.int64), ('billing_counts', np.int64), ('billing_sums', float)):
+            merged = np.zeros(size, dtype=dtype)
+            for cube in (self, other):
+                offset = cube.first_year - first_year
+                merged[offset:offset + len(cube.counts)] += getattr(cube, name)
+            arrays.append(merged)
+        cube = YearCube.__new__(YearCube)
+        cube._set(first_year, *arrays)
+        return cube
+
+    def _bounds(self, start, end):
+        lo = min(max(int(start), self.first_year), self.last_year + 1) - self.first_year
+        hi = min(max(int(end), self.first_year - 1), self.last_year) - self.first_year + 1
+        return lo, max(lo, hi)
+
+    def totals(self, start, end):
+        # (admissions, billing sum, rows with billing) for the inclusive range
+        lo, hi = self._bounds(start, end)
+        return (
+            int(self.count_prefix[hi] - self.count_prefix[lo]),
+            float(self.billing_sum_prefix[hi] - self.billing_sum_prefix[lo]),
+            int(self.billing_count_prefix[hi] - self.billing_count_prefix[lo]),
+        )
+
+    def per_year(self, start, end):
+        # Years in the inclusive range that have admissions, with their
+        # admission counts and average billing amount
+        lo, hi = self._bounds(start, end)
+        counts = np.diff(self.count_prefix[lo:hi + 1])
+        billing_counts = np.diff(self.billing_count_prefix[lo:hi + 1])
+        billing_sums = np.diff(self.billing_sum_prefix[lo:hi + 1])
+
+        present = counts > 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            avg_billing = billing_sums / billing_counts
+        return self.years[lo:hi][present], counts[present], avg_billing[present]
+
+
+def _plain_index(series):
+    # Replace categorical index levels with their labels so tables built from
+    # frames with different category sets can be aligned and added
+    index = series.index
+    if isinstance(index, pd.MultiIndex):
+        arrays = [index.get_level_values(i).astype(object) for i in range(index.nlevels)]
+        series.index = pd.MultiIndex.from_arrays(arrays, names=index.names)
+    else:
+        series.index = index.astype(object)
+    return series
+
+
+def _add_series(left, right):
+    # Align two partial tables on their labels and add them
+    result = left.add(right, fill_value=0)
+    return result.astype(left.dtype if left.dtype == right.dtype else result.dtype)
+
+
+class DatasetAggregates:
+    # Mergeable summaries of the dataset: the overview KPIs, the year cube and
+    # the per-group counts and sums plotted by the other pages. Aggregates of
+    # two disjoint sets of rows merge into the aggregates of their union, so
+    # appended rows are folded in without revisiting the rest of the data.
+
+    def __init__(self, rows, los_sum, los_count, los_min, los_max, billing_sum, billing_count,
+                 billing_min, billing_max, year_cube, group_counts, heavy_hitters, condition_los_sum,
+                 condition_los_count, monthly):
+        self.rows = rows
+        self.los_sum = los_sum
+        self.los_count = los_count
+        self.los_min = los_min
+        self.los_max = los_max
+        self.billing_sum = billing_sum
+        self.billing_count = billing_count
+        self.billing_min = billing_min
+        self.billing_max = billing_max
+        self.year_cube = year_cube
+        self.group_counts = group_counts
+        self.heavy_hitters = heavy_hitters
+        self.condition_los_sum = condition_los_sum
+        self.condition_los_count = condition_los_count
+        self.monthly = monthly
+
+    @classmethod
+    def from_frame(cls, df):
+        los = df['Length of Stay (Days)']
+        group_counts = {
+            columns: _plain_index(df.groupby(list(columns), observed=True).size())
+            for columns in GROUP_COUNTS
+        }
+        heavy_hitters = {
+            columns: HeavyHitters.from_counts(
+                _plain_index(df.groupby(list(columns), observed=True).size()), HEAVY_HITTERS_CAPACITY)
+            for columns in HEAVY_HITTERS
+        }
+        billing = df['Billing Amount']
+        by_condition = df.groupby('Medical Condition', observed=True)['Length of Stay (Days)']
+        return cls(
+            rows=len(df),
+            los_sum=float(los.sum()),
+            los_count=int(los.count()),
+            los_min=float(los.min()),
+            los_max=float(los.max()),
+            billing_sum=float(billing.sum()),
+            billing_count=int(billing.count()),
+            billing_min=float(billing.min()),
+            billing_max=float(billing.max()),
+            year_cube=YearCube.from_frame(df),
+            group_counts=group_counts,
+            heavy_hitters=heavy_hitters,
+            condition_los_sum=_plain_index(by_condition.sum().astype(float)),
+            condition_los_count=_plain_index(by_condition.count()),
+            monthly=MonthlyPartitions.from_frame(df),
+        )
+
+    @classmethod
+    def from_csv(cls, path=dataset.DATA_PATH, chunksize=100_000, length=None):
+        # Stream the CSV (or each of its shards) chunk by chunk, folding each
+        # preprocessed chunk into the running aggregates; only one chunk is
+        # held in memory at a time. `length` limits a single file to its first
+        # bytes, so the watcher can continue exactly where this stopped.
+        result = None
+        for file in dataset.source_paths(path):
+            with dataset.open_prefix(file, length if file == path else None) as f:
+                for chunk in pd.read_csv(f, chunksize=chunksize):
+                    partial = cls.from_frame(dataset.preprocess(chunk))
+                    result = partial if result is None else result.merge(partial)
+        if result is None:
+            result = cls.from_frame(dataset.preprocess(pd.read_csv(dataset.source_paths(path)[0])))
+        return result
+
+    @classmethod
+    def from_store(cls, store):
+        # The same summaries as GROUP BY queries against a healthcare.store.SQLiteStore
+        los, billing = 'Length of Stay (Days)', 'Billing Amount'
+        totals = store.totals([los, billing])
+        years = store.year_totals()
+        by_condition = store.grouped_sums(['Medical Condition'], {
+            'sum': f"TOTAL({quote_name(los)})", 'count': f"COUNT({quote_name(los)})"})
+        return cls(
+            rows=totals['rows'],
+            los_sum=totals[los]['sum'],
+            los_count=totals[los]['count'],
+            los_min=totals[los]['min'],
+            los_max=totals[los]['max'],
+            billing_sum=totals[billing]['sum'],
+            billing_count=totals[billing]['count'],
+            billing_min=totals[billing]['min'],
+            billing_max=totals[billing]['max'],
+            year_cube=YearCube.from_totals(
+                years['year'], years['counts'], years['billing_counts'], years['billing_sums']),
+            group_counts={columns: store.group_counts(columns) for columns in GROUP_COUNTS},
+            heavy_hitters={
+                columns: HeavyHitters.from_counts(store.group_counts(columns), HEAVY_HITTERS_CAPACITY)
+                for columns in HEAVY_HITTERS
+            },
+            condition_los_sum=by_condition['sum'].astype(float).rename(los),
+            condition_los_count=by_condition['count'].astype(np.int64).rename(los),
+            monthly=MonthlyPartitions.from_store(store),
+        )
+
+    def merge(self, other):
+        return DatasetAggregates(
+            rows=self.rows + other.rows,
+            los_sum=self.los_sum + other.los_sum,
+            los_count=self.los_count + other.los_count,
+            los_min=np.fmin(self.los_min, other.los_min),
+            los_max=np.fmax(self.los_max, other.los_max),
+            billing_sum=self.billing_sum + other.billing_sum,
+            billing_count=self.billing_count + other.billing_count,
+            billing_min=np.fmin(self.billing_min, other.billing_min),
+            billing_max=np.fmax(self.billing_max, other.billing_max),
+            year_cube=self.year_cube.merge(other.year_cube),
+            group_counts={
+                columns: _add_series(self.group_counts[columns], other.group_counts[columns])
+                for columns in GROUP_COUNTS
+            },
+            heavy_hitters={
+                columns: self.heavy_hitters[columns].merge(other.heavy_hitters[columns])
+                for columns in HEAVY_HITTERS
+            },
+            condition_los_sum=_add_series(self.condition_los_sum, other.condition_los_sum),
+            condition_los_count=_add_series(self.condition_los_count, other.condition_los_count),
+            # The other rows come after these, so their row positions are shifted
+            monthly=self.monthly.merge(other.monthly, offset=self.rows),
+        )
+
+    # Overview KPIs
+    @property
+    def avg_length_of_stay(self):
+        return self.los_sum / self.los_count if self.los_count else float('nan')
+
+    @property
+    def avg_billing(self):
+        return self.billing_sum / self.billing_count if self.billing_count else float('nan')
+
+    @property
+    def most_common_condition(self):
+        counts = self.counts('Medical Condition')
+        return counts[counts == counts.max()].index[0] if len(counts) else None
+
+    def counts(self, *columns, name='Count', complete=False):
+        # Admissions per group, ordered by the group labels like groupby().size().
+        # complete=True adds zero rows for combinations that never occur.
+        counts = self.group_counts[columns]
+        if complete:
+            levels = [
+                KNOWN_LEVELS.get(column, counts.index.get_level_values(i).unique().sort_values())
+                for i, column in enumerate(columns)
+            ]
+            if len(columns) == 1:
+                full_index = pd.Index(levels[0], name=columns[0])
+            else:
+                full_index = pd.MultiIndex.from_product(levels, names=list(columns))
+            counts = counts.reindex(full_index, fill_value=0)
+        return counts.rename(name)
+
+    def value_counts(self, column, name='Count'):
+        # Admissions per value, most frequent first like Series.value_counts()
+        return self.counts(column, name=name).sort_values(ascending=False, kind='stable')
+
+    def top_counts(self, item, breakdown, k=DEFAULT_TOP_K, name='Count'):
+        # Admissions of the k busiest items per breakdown value plus an "Other"
+        # row, indexed by (item, breakdown) with the largest item first
+        counts = self.heavy_hitters[(item, breakdown)].top(k)
+        return counts.rename_axis([item, breakdown]).rename(name)
+
+    def length_of_stay_sketches(self):
+        # Length-of-stay quantile sketch per blood type, in blood type order
+        counts = self.counts('Blood Type', 'Length of Stay (Days)')
+        return {
+            blood_type: QuantileHistogram.from_counts(group.droplevel('Blood Type'))
+            for blood_type, group in counts.groupby(level='Blood Type', sort=True)
+        }
+
+    def mean_length_of_stay_by_condition(self):
+        return (self.condition_los_sum / self.condition_los_count).rename('Length of Stay (Days)')
+
+
+_aggregates = None
+_aggregates_lock = threading.Lock()
+
+
+def _on_dataset_change(new_rows):
+    # Fold appended rows into the current aggregates; rebuild on a full reload
+    global _aggregates
+    with _aggregates_lock:
+        if new_rows is None or _aggregates is None:
+            _aggregates = None
+        else:
+            _aggregates = _aggregates.merge(DatasetAggregates.from_frame(new_rows))
+
+
+dataset.add_listener(_on_dataset_change)
+
+
+def get_aggregates():
+    global _aggregates
+    if _aggregates is None:
+        if SQLITE_BACKEND:
+            with _aggregates_lock:
+                if _aggregates is None:
+                    _aggregates = DatasetAggregates.from_store(get_store())
+            return _aggregates
+
+        if CHUNKSIZE:
+            with _aggregates_lock:
+                if _aggregates is None:
+                    _aggregates = DatasetAggregates.from_csv(
+                        dataset.DATA_PATH, CHUNKSIZE, dataset.stream_offset())
+            return _aggregates
+
+        # Load outside the lock: the first load notifies _on_dataset_change
+        base, *tail = dataset.get_frames()
+        with _aggregates_lock:
+            if _aggregates is None:
+                result = DatasetAggregates.from_frame(base)
+                for rows in tail:
+                    result = result.merge(DatasetAggregates.from_frame(rows))
+                _aggregates = result
+    return _aggregates
+
+
+class ConditionSummary:
+    # Hospital x Medical Condition sums from a single grouped pass: billing,
+    # admissions, named patients and length-of-stay sum/count. Feeds the
+    # treemap (cells plus hospital rollups) and the condition bubble chart.
+
+    SUM_COLUMNS = ['Billing Amount', 'Admissions', 'Patients', 'Length of Stay Sum', 'Length of Stay Count']
+
+    def __init__(self, cells):
+        self.cells = cells
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls(cls.sum_cells(df, ['Hospital', 'Medical Condition']))
+
+    @classmethod
+    def sum_cells(cls, df, keys):
+        # SUM_COLUMNS per group of `keys` (columns or arrays aligned with df)
+        los = df['Length of Stay (Days)']
+        work = pd.DataFrame({
+            'Billing Amount': df['Billing Amount'],
+            'Admissions': 1,
+            'Patients': df['Name'].notna().astype(np.int64),
+            'Length of Stay Sum': los.astype(float),
+            'Length of Stay Count': los.notna().astype(np.int64),
+        })
+        keys = [df[key] if isinstance(key, str) else key for key in keys]
+        return _plain_index(work.groupby(keys, observed=True)[cls.SUM_COLUMNS].sum())
+
+    def merge(self, other):
+        cells = self.cells.add(other.cells, fill_value=0)
+        return ConditionSummary(cells.astype(self.cells.dtypes.to_dict()))
+
+    def rollup(self, level):
+        totals = self.cells.groupby(level=level).sum()
+        totals['Length of Stay (Days)'] = totals['Length of Stay Sum'] / totals['Length of Stay Count']
+        return totals
+
+    def treemap_nodes(self):
+        # ids/labels/parents/values/colors for a go.Treemap with branchvalues='total'.
+        # Colour is the mean length of stay of the admissions under each node.
+        cells = self.cells.reset_index()
+        hospitals = self.rollup('Hospital').reset_index()
+        mean_los = cells['Length of Stay Sum'] / cells['Length of Stay Count']
+        return pd.DataFrame({
+            'ids': pd.concat([cells['Hospital'] + '/' + cells['Medical Condition'], hospitals['Hospital']], ignore_index=True),
+            'labels': pd.concat([cells['Medical Condition'], hospitals['Hospital']], ignore_index=True),
+            'parents': pd.concat([cells['Hospital'], pd.Series([''] * len(hospitals))], ignore_index=True),
+            'values': pd.concat([cells['Billing Amount'], hospitals['Billing Amount']], ignore_index=True),
+            'colors': pd.concat([mean_los, hospitals['Length of Stay (Days)']], ignore_index=True),
+        })
+
+    def bubble_data(self):
+        # Per-condition billing total, mean length of stay and patient count
+        conditions = self.rollup('Medical Condition').reset_index()
+        return conditions[['Medical Condition', 'Billing Amount', 'Length of Stay (Days)', 'Patients']].rename(
+            columns={'Patients': 'Number of Patients'})
+
+
+class MonthlyPartitions:
+    # Per-month partitions of mergeable statistics behind the medical
+    # condition page, so its figures can be drawn for any range of admission
+    # months by combining the partitions in the range:
+    #   cells    (Month, Hospital, Medical Condition) -> ConditionSummary sums,
+    #            for the treemap and bubble chart
+    #   moments  (Month, Medical Condition) -> counts, means and centred second
+    #            moments (sums of squared deviations and of products of
+    #            deviations from the partition's means) of MOMENT_COLUMNS over
+    #            admissions with a non-negative billing amount, for the
+    #            correlation heatmap
+    # Moments are pooled with Chan et al.'s parallel update rather than from
+    # raw sums of squares, whose difference n * sum(x^2) - sum(x)^2 cancels
+    # most of its digits for billing amounts. They are kept per pair of
+    # columns over the rows where both are present, matching the
+    # pairwise-complete DataFrame.corr(). "First Row" is the position of a
+    # partition's first admission, which gives the pd.factorize order used
+    # to encode conditions.
+
+    MOMENT_COLUMNS = ['Age', 'Billing Amount', 'Length of Stay (Days)']
+    CORRELATION_COLUMNS = MOMENT_COLUMNS + ['Medical Condition']
+
+    def __init__(self, cells, moments):
+        self.cells = cells
+        self.moments = moments
+
+    @classmethod
+    def pairs(cls):
+        columns = cls.MOMENT_COLUMNS
+        return [(a, b) for i, a in enumerate(columns) for b in columns[i:]]
+
+    @staticmethod
+    def pair_stats(a, b):
+        # Statistics stored for a pair; a single column needs only three
+        if a == b:
+            return ['n', 'mean', 'm2']
+        return ['n', 'mean a', 'mean b', 'm2 a', 'm2 b', 'co-moment']
+
+    @classmethod
+    def from_frame(cls, df):
+        months = dataset.month_number(df['Date of Admission'])
+        cells = ConditionSummary.sum_cells(df, [months, 'Hospital', 'Medical Condition'])
+
+        kept = (df['Billing Amount'] >= 0).to_numpy()
+        rows = df[kept]
+        keys = [months[kept], rows['Medical Condition'].astype(object)]
+        # One pair at a time keeps the temporary columns small
+        parts = [pd.DataFrame({'Rows': 1, 'First Row': np.flatnonzero(kept)}, index=rows.index)
+                 .groupby(keys, dropna=False).agg({'Rows': 'sum', 'First Row': 'min'})]
+        for a, b in cls.pairs():
+            both = rows[a].notna() & rows[b].notna()
+            x = rows[a].astype(float).where(both)
+            y = rows[b].astype(float).where(both)
+            dx = x - x.groupby(keys, dropna=False).transform('mean')
+            dy = y - y.groupby(keys, dropna=False).transform('mean')
+            values = [both.astype(np.int64), x, dx * dx] if a == b else \
+                [both.astype(np.int64), x, y, dx * dx, dy * dy, dx * dy]
+            work = pd.DataFrame({f"{a}|{b}|{stat}": value for stat, value in zip(cls.pair_stats(a, b), values)})
+            grouped = work.groupby(keys, dropna=False)
+            part = grouped.sum()
+            for stat in ['mean'] if a == b else ['mean a', 'mean b']:
+                # A partition without complete rows gets mean 0 and adds nothing when pooled
+                part[f"{a}|{b}|{stat}"] = grouped[f"{a}|{b}|{stat}"].mean().fillna(0.0)
+            parts.append(part)
+        moments = pd.concat(parts, axis=1)
+        moments.index.names = ['Month', 'Medical Condition']
+        return cls(cells, moments)
+
+    @classmethod
+    def from_store(cls, store):
+        # The same partitions as GROUP BY queries against a healthcare.store.SQLiteStore
+        billing, los, name = quote_name('Billing Amount'), quote_name('Length of Stay (Days)'), quote_name('Name')
+        cells = store.grouped_sums([dataset.MONTH_COLUMN, 'Hospital', 'Medical Condition'], {
+            'Billing Amount': f"TOTAL({billing})",
+            'Admissions': "COUNT(*)",
+            'Patients': f"COUNT({name})",
+            'Length of Stay Sum': f"TOTAL({los})",
+            'Length of Stay Count': f"COUNT({los})",
+        }, not_null=['Hospital', 'Medical Condition'])
+        cells = cells.astype({
+            'Billing Amount': float, 'Admissions': np.int64, 'Patients': np.int64,
+            'Length of Stay Sum': float, 'Length of Stay Count': np.int64,
+        })
+        cells.index = cells.index.set_levels(cells.index.levels[0].astype(np.int64), level=0)
+        cells.index.names = ['Month', 'Hospital', 'Medical Condition']
+
+        # Deviations from each partition's means come from window averages
+        # over the partition, so the centred moments are summed directly
+        partition = f"PARTITION BY {quote_name(dataset.MONTH_COLUMN)}, {quote_name('Medical Condition')}"
+        deviations = ['rowid AS "Row"']
+        sums = {'Rows': "COUNT(*)", 'First Row': 'MIN("Row") - 1'}
+        for a, b in cls.pairs():
+            x, y = quote_name(a), quote_name(b)
+            both = f"({x} IS NOT NULL AND {y} IS NOT NULL)"
+            dx, dy = quote_name(f"{a}|{b}|dx"), quote_name(f"{a}|{b}|dy")
+            deviations += [f"{x} - AVG(CASE WHEN {both} THEN {x} END) OVER ({partition}) AS {dx}",
+                           f"{y} - AVG(CASE WHEN {both} THEN {y} END) OVER ({partition}) AS {dy}"]
+            expressions = [f"TOTAL({both})", f"COALESCE(AVG(CASE WHEN {both} THEN {x} END), 0)",
+                           f"TOTAL(CASE WHEN {both} THEN {dx} * {dx} END)"] if a == b else [
+                f"TOTAL({both})", f"COALESCE(AVG(CASE WHEN {both} THEN {x} END), 0)",
+                f"COALESCE(AVG(CASE WHEN {both} THEN {y} END), 0)",
+                f"TOTAL(CASE WHEN {both} THEN {dx} * {dx} END)", f"TOTAL(CASE WHEN {both} THEN {dy} * {dy} END)",
+                f"TOTAL(CASE WHEN {both} THEN {dx} * {dy} END)"]
+            for stat, expression in zip(cls.pair_stats(a, b), expressions):
+                sums[f"{a}|{b}|{stat}"] = expression
+        table = f"(SELECT *, {', '.join(deviations)} FROM {TABLE} WHERE {billing} >= 0)"
+        moments = store.grouped_sums([dataset.MONTH_COLUMN, 'Medical Condition'], sums, not_null=[], table=table)
+        moments = moments.astype({'Rows': np.int64, 'First Row': np.int64})
+        moments.index = pd.MultiIndex.from_arrays(
+            [moments.index.get_level_values(0).astype(np.int64), moments.index.get_level_values(1)],
+            names=['Month', 'Medical Condition'])
+        return cls(cells, moments)
+
+    @classmethod
+    def pool(cls, moments, level):
+        # Moments of the partitions combined per `level` with Chan et al.'s
+        # parallel update: counts add, means are count-weighted, and each
+        # partition adds n times the products of its means' deviations from
+        # the pooled means to the centred moments
+        def summed(values):
+            return values.groupby(level=level, dropna=False).sum()
+
+        def broadcast(values):
+            # Group sums repeated on each partition of the group
+            return values.groupby(level=level, dropna=False).transform('sum')
+
+        result = {'Rows': summed(moments['Rows']),
+                  'First Row': moments['First Row'].groupby(level=level, dropna=False).min()}
+        for a, b in cls.pairs():
+            stats = {stat: moments[f"{a}|{b}|{stat}"] for stat in cls.pair_stats(a, b)}
+            n = stats['n']
+            means = ['mean'] if a == b else ['mean a', 'mean b']
+            pooled, deviations = [], []
+            total = summed(n)
+            for stat in means:
+                # Groups without complete rows keep mean 0, like their partitions
+                pooled.append((summed(stats[stat] * n) / total.where(total > 0)).fillna(0.0))
+                deviations.append(stats[stat] - (broadcast(stats[stat] * n) / broadcast(n)).fillna(0.0))
+            if a == b:
+                (da,) = deviations
+                values = [total, *pooled, summed(stats['m2'] + n * da * da)]
+            else:
+                da, db = deviations
+                values = [total, *pooled, summed(stats['m2 a'] + n * da * da),
+                          summed(stats['m2 b'] + n * db * db), summed(stats['co-moment'] + n * da * db)]
+            for stat, value in zip(cls.pair_stats(a, b), values):
+                result[f"{a}|{b}|{stat}"] = value
+        return pd.DataFrame(result)
+
+    def merge(self, other, offset=0):
+        # Partitions of both sets of rows; `offset` is the number of rows
+        # before the other set, to keep row positions in file order
+        cells = self.cells.add(other.cells, fill_value=0).astype(self.cells.dtypes.to_dict())
+        shifted = other.moments.assign(**{'First Row': other.moments['First Row'] + offset})
+        moments = self.pool(pd.concat([self.moments, shifted]), ['Month', 'Medical Condition'])
+        return MonthlyPartitions(cells.sort_index(), moments.astype(self.moments.dtypes.to_dict()))
+
+    @property
+    def months(self):
+        # Months with admissions, in order (admissions without a date excluded)
+        months = self.cells.index.get_level_values('Month').unique()
+        return np.sort(np.asarray(months[months != dataset.NO_MONTH], dtype=np.int64))
+
+    @staticmethod
+    def _in_range(table, first_month, last_month):
+        # Partitions of the inclusive month range; the full range (None, None)
+        # also takes admissions without a date
+        if first_month is None and last_month is None:
+            return table
+        months = np.asarray(table.index.get_level_values('Month'), dtype=np.int64)
+        mask = months != dataset.NO_MONTH
+        if first_month is not None:
+            mask &= months >= first_month
+        if last_month is not None:
+            mask &= months <= last_month
+        return table[mask]
+
+    def condition_summary(self, first_month=None, last_month=None):
+        cells = self._in_range(self.cells, first_month, last_month)
+        return ConditionSummary(cells.groupby(level=['Hospital', 'Medical Condition']).sum())
+
+    def correlation(self, first_month=None, last_month=None):
+        # Pearson correlation matrix of CORRELATION_COLUMNS over the month
+        # range, with the condition encoded as pd.factorize codes
+        moments = self._in_range(self.moments, first_month, last_month)
+        by_condition = self.pool(moments, 'Medical Condition')
+        conditions = by_condition.index
+        codes = np.full(len(conditions), -1.0)
+        known = ~pd.isna(conditions)
+        codes[known] = pd.Series(by_condition['First Row'][known].to_numpy()).rank(method='first').to_numpy() - 1
+        zeros = np.zeros(len(conditions))
+
+        def pooled(n, mean_a, mean_b, m2_a, m2_b, products):
+            # (n, m2 a, m2 b, co-moment) of the conditions' moments pooled together
+            n = np.asarray(n, dtype=float)
+            total = n.sum()
+            if total == 0:
+                return 0, 0.0, 0.0, 0.0
+            da = mean_a - (n * mean_a).sum() / total
+            db = mean_b - (n * mean_b).sum() / total
+            return total, (m2_a + n * da * da).sum(), (m2_b + n * db * db).sum(), (products + n * da * db).sum()
+
+        def stats(a, b):
+            return [by_condition[f"{a}|{b}|{stat}"].to_numpy(dtype=float) for stat in self.pair_stats(a, b)]
+
+        def totals(a, b):
+            # Within a condition its code is constant: mean `codes`, no spread
+            if a == 'Medical Condition' and b == 'Medical Condition':
+                rows = by_condition['Rows'].to_numpy()
+                return pooled(rows, codes, codes, zeros, zeros, zeros)
+            if b == 'Medical Condition':
+                n, mean, m2 = stats(a, a)
+                return pooled(n, mean, codes, m2, zeros, zeros)
+            if a == b:
+                n, mean, m2 = stats(a, a)
+                return pooled(n, mean, mean, m2, m2, m2)
+            return pooled(*stats(a, b))
+
+        columns = self.CORRELATION_COLUMNS
+        matrix = pd.DataFrame(np.nan, index=columns, columns=columns)
+        for i, a in enumerate(columns):
+            for b in columns[i:]:
+                n, m2_a, m2_b, products = totals(a, b)
+                if n > 1 and m2_a * m2_b > 0:
+                    matrix.loc[a, b] = matrix.loc[b, a] = 1.0 if a == b else products / np.sqrt(m2_a * m2_b)
+        return matrix
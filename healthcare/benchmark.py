@@ -0,0 +1,273 @@
+import argparse
+import importlib
+import importlib.util
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+from plotly.io.json import to_json_plotly
+
+# Dataset sizes benchmarked by default; 1M and 10M can be added with --rows
+DEFAULT_ROWS = [10_000, 100_000]
+# Generated datasets and reports; kept out of assets/, which Dash serves publicly
+BENCH_DIR = os.environ.get("HEALTHCARE_BENCH_DIR", "./.bench")
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _json_bytes(value):
+    return len(to_json_plotly(value))
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def _peak_memory(func, *args):
+    # Peak bytes allocated while func runs (numpy and pandas buffers included)
+    tracemalloc.start()
+    try:
+        func(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure_callback(func, args, repeat, reset=None):
+    # First-call and repeated-call latency, peak memory and output size. reset()
+    # runs before the memory pass so a memoised callback does its work again.
+    cold, result = _timed(func, *args)
+    warm = [_timed(func, *args)[0] for _ in range(repeat)]
+    if reset is not None:
+        reset()
+    return {
+        "cold_seconds": cold,
+        "warm_seconds": statistics.median(warm) if warm else None,
+        "peak_memory_bytes": _peak_memory(func, *args),
+        "output_bytes": _json_bytes(result),
+    }
+
+
+def _graphs(component, found=None):
+    # dcc.Graph components of a layout tree, in document order
+    found = [] if found is None else found
+    if type(component).__name__ == "Graph":
+        found.append(component)
+    children = getattr(component, "children", None)
+    for child in children if isinstance(children, (list, tuple)) else [children]:
+        if hasattr(child, "to_plotly_json"):
+            _graphs(child, found)
+    return found
+
+
+def _page_callbacks():
+    # (name, callback, args) for the dashboard's server-side callbacks, with
+    # inputs picked from the loaded data
+    overview = sys.modules["pages.overview"]
+    blood = sys.modules["pages.blood-type-analysis"]
+    insurance = sys.modules["pages.insurance"]
+    conditions = sys.modules["pages.medical_condition_analysis"]
+    from healthcare.aggregates import TOP_K_CHOICES, get_aggregates
+
+    cube = get_aggregates().year_cube
+    # A 90-day zoom around the median admission date
+    timeline = conditions.get_timeline()
+    middle = pd.Timestamp(timeline.dates[len(timeline) // 2])
+    window = {
+        "xaxis.range[0]": str(middle - pd.Timedelta(days=45)),
+        "xaxis.range[1]": str(middle + pd.Timedelta(days=45)),
+    }
+    largest_k = max(TOP_K_CHOICES)
+
+    # A filter the table silently ignored would time the unfiltered path
+    table_filter = "{Gender} s= Female"
+    _, filtered_pages = overview.update_patient_table(0, 20, None, table_filter)
+    _, all_pages = overview.update_patient_table(0, 20, None, "")
+    if not filtered_pages < all_pages:
+        raise RuntimeError(f"{table_filter!r} did not filter the Patient Details table")
+
+    return [
+        ("pages.overview.update_graphs", overview.update_graphs, ([cube.first_year, cube.last_year],)),
+        ("pages.overview.update_patient_table", overview.update_patient_table,
+         (3, 20, [{"column_id": "Billing Amount", "direction": "desc"}], table_filter)),
+        ("pages.insurance.update_hospital_insurance", insurance.update_hospital_insurance, (largest_k,)),
+        ("pages.blood-type-analysis.update_blood_type_hospital", blood.update_blood_type_hospital, (largest_k,)),
+        ("pages.blood-type-analysis.update_blood_type_doctor", blood.update_blood_type_doctor, (largest_k,)),
+        ("pages.medical_condition_analysis.update_timeline", conditions.update_timeline, (window,)),
+    ]
+
+
+def run_dashboard(repeat):
+    # Startup, per-page layout and callback measurements for app.py
+    sys.path.insert(0, REPO_DIR)
+    results = {}
+    import_seconds, _ = _timed(importlib.import_module, "app")
+    import dash
+    from healthcare import aggregates, dataset
+    from healthcare.figure_cache import figure_cache
+
+    load_seconds, _ = _timed(dataset.get_dataset)
+    aggregate_seconds, _ = _timed(aggregates.get_aggregates)
+    results["startup"] = {
+        "import_seconds": import_seconds,
+        "load_dataset_seconds": load_seconds,
+        "build_aggregates_seconds": aggregate_seconds,
+    }
+
+    pages = {}
+    for page in dash.page_registry.values():
+        layout = page["layout"]
+        seconds, tree = _timed(layout) if callable(layout) else (0.0, layout)
+        module = sys.modules[page["module"]]
+        build = getattr(module, "build_layout", None)
+        if build is not None and hasattr(build, "__wrapped__"):
+            peak = _peak_memory(build.__wrapped__)
+        else:
+            peak = _peak_memory(layout) if callable(layout) else 0
+        pages[page["path"]] = {
+            "module": page["module"],
+            "layout_seconds": seconds,
+            "peak_memory_bytes": peak,
+            "layout_bytes": _json_bytes(tree),
+            "figure_bytes": {
+                graph.id if hasattr(graph, "id") else f"graph-{i}": _json_bytes(getattr(graph, "figure", None))
+                for i, graph in enumerate(_graphs(tree))
+            },
+        }
+    results["pages"] = pages
+
+    results["callbacks"] = {
+        name: measure_callback(func, args, repeat, reset=figure_cache.clear)
+        for name, func, args in _page_callbacks()
+    }
+    return results
+
+
+def run_app_test(data_path, repeat):
+    # app-test.py reads assets/healthcare.csv relative to the working directory
+    # at import time, so it is imported from a scratch directory pointing there
+    results = {}
+    with tempfile.TemporaryDirectory() as scratch:
+        os.makedirs(os.path.join(scratch, "assets"))
+        os.symlink(os.path.abspath(data_path), os.path.join(scratch, "assets", "healthcare.csv"))
+        cwd = os.getcwd()
+        os.chdir(scratch)
+        try:
+            spec = importlib.util.spec_from_file_location("app_test", os.path.join(REPO_DIR, "app-test.py"))
+            module = importlib.util.module_from_spec(spec)
+            import_seconds, _ = _timed(spec.loader.exec_module, module)
+        finally:
+            os.chdir(cwd)
+
+    results["startup"] = {"import_seconds": import_seconds}
+    results["layout_bytes"] = _json_bytes(module.app.layout)
+    # The most common condition and the top of the billing slider
+    condition = module.df["Medical Condition"].value_counts().index[0]
+    max_billing = float(module.df["Billing Amount"].max())
+    cases = [
+        ("update_age_distribution", "all", (None,)),
+        ("update_age_distribution", "female", ("Female",)),
+        ("update_condition_distribution", "all", (None,)),
+        ("update_admission_trends", "line", ("line", None)),
+        ("update_admission_trends", "bar-condition", ("bar", condition)),
+        ("update_billing_distribution", "all", (None, max_billing)),
+        ("update_insurance_comparison", "all", (None,)),
+    ]
+    results["callbacks"] = {
+        f"app-test.{name}[{label}]": measure_callback(getattr(module, name), args, repeat)
+        for name, label, args in cases
+    }
+    return results
+
+
+def run_child(data_path, repeat, include_app_test):
+    # One dataset size, measured in a fresh interpreter so that module-level
+    # state (the loaded frame, caches) starts empty
+    results = {"dashboard": run_dashboard(repeat)}
+    if include_app_test:
+        results["app_test"] = run_app_test(data_path, repeat)
+    results["max_rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def dataset_path(rows, bench_dir=BENCH_DIR, source=None, seed=0):
+    # Synthetic dataset of `rows` rows, generated on first use and reused after
+    path = os.path.join(bench_dir, f"synthetic-{rows}-seed{seed}.csv")
+    if not os.path.exists(path):
+        from healthcare.synthetic import SyntheticAdmissions
+        from healthcare.dataset import DATA_PATH
+        SyntheticAdmissions(source or DATA_PATH).write(path, rows, seed)
+    return path
+
+
+def run(rows_list, output, bench_dir=BENCH_DIR, repeat=5, include_app_test=True, seed=0):
+    report = {
+        "commit": _git_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "runs": [],
+    }
+    for rows in rows_list:
+        path = dataset_path(rows, bench_dir, seed=seed)
+        env = dict(os.environ, HEALTHCARE_DATA=os.path.abspath(path), HEALTHCARE_WATCH_INTERVAL="0")
+        command = [sys.executable, "-m", "healthcare.benchmark", "--child", path, "--repeat", str(repeat)]
+        if not include_app_test:
+            command.append("--skip-app-test")
+        start = time.perf_counter()
+        completed = subprocess.run(command, cwd=REPO_DIR, env=env, capture_output=True, text=True)
+        run_result = {"rows": rows, "data": path, "wall_seconds": time.perf_counter() - start}
+        if completed.returncode == 0:
+            run_result.update(json.loads(completed.stdout.splitlines()[-1]))
+        else:
+            run_result["error"] = completed.stderr[-2000:]
+        report["runs"].append(run_result)
+        print(f"{rows} rows: {run_result['wall_seconds']:.1f}s" + (" (failed)" if "error" in run_result else ""),
+              file=sys.stderr)
+
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark page startup, layouts and callbacks on synthetic data.")
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS, help="dataset sizes to benchmark")
+    parser.add_argument("--output", default="benchmark.json", help="JSON file to write the results to")
+    parser.add_argument("--bench-dir", default=BENCH_DIR, help="directory holding the generated datasets")
+    parser.add_argument("--repeat", type=int, default=5, help="repeated calls per callback")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for the generated datasets")
+    parser.add_argument("--skip-app-test", action="store_true", help="do not benchmark app-test.py")
+    parser.add_argument("--child", metavar="CSV", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        results = run_child(args.child, args.repeat, not args.skip_app_test)
+        # Only the last line of stdout is read by the parent
+        print(json.dumps(results, default=str))
+        return
+
+    run(args.rows, args.output, args.bench_dir, args.repeat, not args.skip_app_test, args.seed)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
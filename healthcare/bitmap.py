@@ -0,0 +1,68 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Categorical columns the dashboard filters on
+INDEX_COLUMNS = ['Gender', 'Medical Condition', 'Insurance Provider', 'Blood Type']
+
+
+class BitmapIndex:
+    # One packed bitmap (a bit per row) for every distinct value of the indexed
+    # columns, so an equality filter is a dictionary lookup and several filters
+    # combine with a bitwise AND instead of a string comparison over the whole
+    # frame. Filtered subsets are kept in a small LRU, so callbacks fired by
+    # the same input share one subset instead of each filtering again.
+
+    def __init__(self, df, columns=INDEX_COLUMNS, max_subsets=32):
+        self.df = df
+        self.rows = len(df)
+        self.max_subsets = max_subsets
+        self._bitmaps = {}
+        for column in columns:
+            codes, values = pd.factorize(df[column])
+            # Missing values get code -1 and therefore no bitmap
+            self._bitmaps[column] = {value: np.packbits(codes == code) for code, value in enumerate(values)}
+        self._empty = np.zeros((self.rows + 7) // 8, dtype=np.uint8)
+        self._subsets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def values(self, column):
+        # Distinct values of an indexed column, in order of first appearance
+        return list(self._bitmaps[column])
+
+    def bitmap(self, column, value):
+        # Packed bitmap of the rows where `column` equals `value`
+        return self._bitmaps[column].get(value, self._empty)
+
+    @staticmethod
+    def _key(filters):
+        # Filters set to None (e.g. a cleared dropdown) select every row
+        return tuple(sorted((column, value) for column, value in filters.items() if value is not None))
+
+    def row_ids(self, filters):
+        # Positions of the rows matching every {column: value} filter, in frame order
+        key = self._key(filters)
+        if not key:
+            return np.arange(self.rows)
+        bits = self.bitmap(*key[0])
+        for column, value in key[1:]:
+            bits = bits & self.bitmap(column, value)
+        return np.flatnonzero(np.unpackbits(bits, count=self.rows))
+
+    def subset(self, filters):
+        # Rows of the frame matching every filter, as df[mask] would return them
+        key = self._key(filters)
+        if not key:
+            return self.df
+        with self._lock:
+            frame = self._subsets.get(key)
+            if frame is not None:
+                self._subsets.move_to_end(key)
+                return frame
+            frame = self.df.take(self.row_ids(filters))
+            self._subsets[key] = frame
+            while len(self._subsets) > self.max_subsets:
+                self._subsets.popitem(last=False)
+            return frame
@@ -0,0 +1,261 @@
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; cache writes are then unserialised
+    fcntl = None
+
+# Preprocessed frames are cached as one .npy file per column, in a slot per
+# source file. HEALTHCARE_CACHE_DIR moves the cache; keep it out of assets/,
+# which Dash serves to anyone. Bump CACHE_FORMAT whenever preprocessing
+# changes what ends up in the frame.
+CACHE_DIR = os.environ.get("HEALTHCARE_CACHE_DIR", "./.cache")
+CACHE_FORMAT = 5
+META_FILE = "dataset.json"
+LOCK_FILE = ".lock"
+
+# Numeric, datetime and category-code columns are memory-mapped from the cache
+# rather than read into each process, so every worker (and every page, through
+# its shallow copy) shares one page-cache copy. Free-text columns (e.g. Name)
+# are read back as categoricals too: mapped codes plus one dictionary, which
+# workers forked after a preload share. HEALTHCARE_CACHE_MMAP=0 reads them
+# into memory instead.
+USE_MMAP = os.environ.get("HEALTHCARE_CACHE_MMAP", "1") != "0"
+
+
+def file_digest(path, length=None, chunk_size=1 << 20):
+    # SHA-256 of the file, or of its first `length` bytes
+    digest = hashlib.sha256()
+    remaining = float("inf") if length is None else length
+    with open(path, "rb") as f:
+        while remaining > 0:
+            chunk = f.read(int(min(chunk_size, remaining)))
+            if not chunk:
+                break
+            digest.update(chunk)
+            remaining -= len(chunk)
+    return digest.hexdigest()
+
+
+def source_key(path, length=None, digest=None):
+    # Identifies the first `length` bytes of `path` (all of it by default):
+    # the bytes a cached frame was parsed from
+    stat = os.stat(path)
+    length = stat.st_size if length is None else length
+    return {
+        "path": os.path.abspath(path),
+        "size": length,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": digest if digest is not None else file_digest(path, length),
+    }
+
+
+def slot_dir(path, cache_dir=CACHE_DIR):
+    # Each source file is cached in its own directory, so caching another
+    # source (e.g. a benchmark dataset) never evicts or replaces this one
+    name = hashlib.sha256(os.path.abspath(path).encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, name)
+
+
+def _read_meta(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, META_FILE)) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("format") != CACHE_FORMAT:
+        return None
+    return meta
+
+
+def _write_json(path, payload):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(payload, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def lookup(path, cache_dir=CACHE_DIR):
+    # Return the cache metadata for `path` or None when the cache is stale.
+    # The cache holds the rows of the first meta["source"]["size"] bytes and
+    # stays valid while the file starts with those bytes, so rows appended
+    # since are parsed on top of it instead of rebuilding it. Size and mtime
+    # are checked first; the hash of the cached bytes is only computed when
+    # they changed (an append, or a checkout that touched the file).
+    cache_dir = slot_dir(path, cache_dir)
+    meta = _read_meta(cache_dir)
+    if meta is None:
+        return None
+    cached = meta["source"]
+    stat = os.stat(path)
+    if stat.st_size < cached["size"]:
+        return None
+    if stat.st_size == cached["size"] and stat.st_mtime_ns == cached["mtime_ns"]:
+        return meta
+    if file_digest(path, cached["size"]) != cached["sha256"]:
+        return None
+    if stat.st_size == cached["size"]:
+        meta["source"] = source_key(path, digest=cached["sha256"])
+        _write_json(os.path.join(cache_dir, META_FILE), meta)
+    return meta
+
+
+def current_generation(path, cache_dir=CACHE_DIR):
+    # Generation of the cache of `path` on disk; bumped by every write_cache
+    meta = _read_meta(slot_dir(path, cache_dir))
+    return None if meta is None else meta.get("generation")
+
+
+@contextlib.contextmanager
+def write_lock(cache_dir):
+    # Serialise rebuilds of files in `cache_dir` between processes (e.g. server workers)
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(os.path.join(cache_dir, LOCK_FILE), "w") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def write_cache(df, key, cache_dir=CACHE_DIR):
+    # Column files go into a new directory per generation, so files other
+    # processes have mapped are never rewritten; the metadata file is replaced
+    # last so readers never see a partial cache and switch generations at once.
+    cache_dir = slot_dir(key["path"], cache_dir)
+    previous = _read_meta(cache_dir)
+    generation = (previous.get("generation", 0) if previous else 0) + 1
+    data_dir = f"{key['sha256'][:16]}-{generation}"
+    target = os.path.join(cache_dir, data_dir)
+    os.makedirs(target, exist_ok=True)
+
+    columns = []
+    for i, name in enumerate(df.columns):
+        series = df[name]
+        entry = {"name": name, "file": f"col{i}.npy"}
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            entry["kind"] = "category"
+            entry["ordered"] = bool(series.cat.ordered)
+            codes = series.cat.codes.to_numpy()
+            categories = series.cat.categories.to_numpy()
+        elif series.dtype == object:
+            entry["kind"] = "string"
+            # Sorted, so the categories compare and sort like the strings did
+            codes, categories = pd.factorize(series, sort=True)
+        else:
+            entry["kind"] = "array"
+            np.save(os.path.join(target, entry["file"]), series.to_numpy())
+            columns.append(entry)
+            continue
+        entry["categories"] = f"col{i}.categories.npy"
+        np.save(os.path.join(target, entry["file"]), codes)
+        np.save(os.path.join(target, entry["categories"]), np.asarray(categories, dtype=str))
+        columns.append(entry)
+
+    meta = {
+        "format": CACHE_FORMAT, "generation": generation, "source": key, "data": data_dir,
+        "columns": columns, "rows": len(df),
+    }
+    _write_json(os.path.join(cache_dir, META_FILE), meta)
+
+    # Drop column files of earlier generations of this source; processes
+    # still mapping them keep their (unlinked) files until they remap
+    for entry in os.listdir(cache_dir):
+        full_path = os.path.join(cache_dir, entry)
+        if entry != data_dir and os.path.isdir(full_path):
+            shutil.rmtree(full_path, ignore_errors=True)
+    return meta
+
+
+def read_cache(meta, cache_dir=CACHE_DIR, mmap=USE_MMAP):
+    # Mapped arrays are copy-on-write (mmap_mode="c"): a process that writes to
+    # one gets private pages instead of changing the file. Codes were written
+    # from valid categoricals, so they are wrapped without a validating copy.
+    # Free-text columns (kind "string") stay categorical rather than being
+    # rebuilt as a Python object per row in each process.
+    target = os.path.join(slot_dir(meta["source"]["path"], cache_dir), meta["data"])
+    mmap_mode = "c" if mmap else None
+    data = {}
+    for entry in meta["columns"]:
+        # Plain ndarray views of the mapping, so pandas never hands out np.memmap
+        values = np.load(os.path.join(target, entry["file"]), mmap_mode=mmap_mode).view(np.ndarray)
+        if entry["kind"] == "array":
+            data[entry["name"]] = values
+            continue
+        categories = np.load(os.path.join(target, entry["categories"]))
+        dtype = pd.CategoricalDtype(categories.astype(object), ordered=entry.get("ordered", False))
+        data[entry["name"]] = pd.Categorical.from_codes(values, dtype=dtype, validate=False)
+    return pd.DataFrame(data, copy=False)
+
+
+def load_cached(path, loader, cache_dir=CACHE_DIR):
+    # loader(path) returns a frame and the number of bytes of `path` it was
+    # parsed from. Returns (frame, bytes, generation): the cached frame when
+    # the cache is current, which may hold fewer bytes than the file now has,
+    # or loader's result, cached first (generation None when uncached).
+    try:
+        meta = lookup(path, cache_dir)
+        if meta is not None:
+            return read_cache(meta, cache_dir), meta["source"]["size"], meta["generation"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    try:
+        with write_lock(slot_dir(path, cache_dir)):
+            # Another process may have rebuilt the cache while this one waited
+            meta = lookup(path, cache_dir)
+            if meta is None:
+                frame, length = loader(path)
+                meta = write_cache(frame, source_key(path, length), cache_dir)
+            return read_cache(meta, cache_dir), meta["source"]["size"], meta["generation"]
+    except OSError:
+        # A read-only deployment still works, it just parses the CSV every time
+        frame, length = loader(path)
+        return frame, length, None
+
+
+def store_prefix(path, frame, length, cache_dir=CACHE_DIR):
+    # Cache frame() as the rows of the first `length` bytes of `path`, unless
+    # the cache already holds at least those bytes; returns the cache metadata
+    with write_lock(slot_dir(path, cache_dir)):
+        meta = lookup(path, cache_dir)
+        if meta is None or meta["source"]["size"] < length:
+            meta = write_cache(frame(), source_key(path, length), cache_dir)
+        return meta
+
+
+def main(argv=None):
+    from healthcare.dataset import DATA_PATH, read_file
+
+    parser = argparse.ArgumentParser(description="Build the preprocessed dataset cache.")
+    parser.add_argument("--source", default=DATA_PATH, help="CSV file to preprocess")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="directory holding the cache")
+    parser.add_argument("--force", action="store_true", help="rebuild even if the cache is current")
+    args = parser.parse_args(argv)
+
+    meta = lookup(args.source, args.cache_dir)
+    if not args.force and meta is not None and meta["source"]["size"] == os.path.getsize(args.source):
+        print(f"Cache for {args.source} is up to date in {args.cache_dir}")
+        return
+
+    start = time.perf_counter()
+    with write_lock(slot_dir(args.source, args.cache_dir)):
+        df, length = read_file(args.source)
+        meta = write_cache(df, source_key(args.source, length), args.cache_dir)
+    elapsed = time.perf_counter() - start
+    print(f"Cached {meta['rows']} rows from {args.source} into {slot_dir(args.source, args.cache_dir)} in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
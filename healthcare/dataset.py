@@ -0,0 +1,470 @@
+import argparse
+import glob
+import io
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from healthcare import cache
+
+# Every page shares one preprocessed frame per process. Copy-on-write makes the
+# shallow copies handed to pages behave like independent frames, so a page that
+# assigns or overwrites a column only ever changes its own view.
+pd.set_option("mode.copy_on_write", True)
+
+# Specify the file path. HEALTHCARE_DATA may instead name a directory of CSV
+# shards or a glob such as ./exports/admissions-*.csv
+DATA_PATH = os.environ.get("HEALTHCARE_DATA", "./assets/data.csv")
+
+# Processes used to parse a sharded source; 0 means one per CPU
+LOAD_WORKERS = int(os.environ.get("HEALTHCARE_LOAD_WORKERS", 0))
+
+# Dates in the export look like 1/31/2024; an explicit format avoids per-value inference
+DATE_FORMAT = "%m/%d/%Y"
+
+# HEALTHCARE_BACKEND=sqlite answers the pages from an indexed SQLite copy of the
+# data (healthcare.store) instead of a DataFrame held by every process
+BACKEND = os.environ.get("HEALTHCARE_BACKEND", "memory")
+
+# Set HEALTHCARE_CHUNKSIZE to a row count to build the aggregates by streaming the
+# CSV in chunks of that size instead of from the in-memory frame; peak memory is
+# then bounded by the chunk size rather than the file size
+CHUNKSIZE = int(os.environ.get("HEALTHCARE_CHUNKSIZE", 0))
+
+# Set HEALTHCARE_CACHE=0 to always parse the CSV instead of using the on-disk cache
+USE_CACHE = os.environ.get("HEALTHCARE_CACHE", "1") != "0"
+
+# Appended rows are kept in a tail next to the base frame until there are this
+# many, then folded into a new base (a new cache generation, when cached)
+COMPACT_ROWS = int(os.environ.get("HEALTHCARE_COMPACT_ROWS", 20_000))
+
+# Age groups used by the insurance and blood type pages
+AGE_BINS = [0, 18, 35, 50, 65, 100]
+AGE_LABELS = ["0-18", "19-35", "36-50", "51-65", "65+"]
+
+# Low-cardinality text columns are stored dictionary-encoded and small
+# integer columns are downcast; see `python -m healthcare.dataset --memory-report`
+CATEGORICAL_COLUMNS = [
+    'Gender', 'Blood Type', 'Medical Condition', 'Insurance Provider', 'Admission Type',
+    'Medication', 'Test Results', 'Hospital', 'Doctor',
+]
+DOWNCAST_COLUMNS = ['Age', 'Room Number']
+
+# Admission months are numbered year * 12 + month - 1; NO_MONTH marks a missing date
+MONTH_COLUMN = 'Admission Month'
+NO_MONTH = -1
+
+_dataset = None     # base frame, mapped from the cache when cached
+_tail = []          # frames of rows appended since the base was loaded
+_combined = None    # base and tail as one frame, built on demand
+_offset = None      # bytes of a single-file source held (frame or streamed aggregates)
+_version = 0
+_generation = None
+_source = None
+_lock = threading.Lock()
+_listeners = []
+_version_listeners = []
+
+
+def parse_dates(values):
+    try:
+        return pd.to_datetime(values, format=DATE_FORMAT)
+    except ValueError:
+        # Fall back to inference for exports that use another date layout
+        return pd.to_datetime(values)
+
+
+def month_number(dates):
+    months = dates.dt.year * 12 + dates.dt.month - 1
+    return months.fillna(NO_MONTH).astype('int64').rename('Month')
+
+
+def compact(df):
+    for column in CATEGORICAL_COLUMNS:
+        df[column] = df[column].astype('category')
+    for column in DOWNCAST_COLUMNS:
+        df[column] = pd.to_numeric(df[column], downcast='integer')
+    return df
+
+
+def preprocess(df, compact_columns=True):
+    df['Date of Admission'] = parse_dates(df['Date of Admission'])
+    df['Discharge Date'] = parse_dates(df['Discharge Date'])
+    df['Length of Stay (Days)'] = (df['Discharge Date'] - df['Date of Admission']).dt.days
+    df['Name'] = df['Name'].str.title()
+    df['Gender'] = df['Gender'].str.capitalize()
+    df['Hospital'] = df['Hospital'].str.strip()
+    df['Medical Condition'] = df['Medical Condition'].str.capitalize()
+
+    # Derived columns
+    df['Age Group'] = pd.cut(df['Age'], bins=AGE_BINS, labels=AGE_LABELS, right=False)
+
+    if compact_columns:
+        df = compact(df)
+    return df
+
+
+def source_paths(source=DATA_PATH):
+    # CSV files making up a source: the file itself, the *.csv files of a
+    # directory, or the matches of a glob, in name order
+    if os.path.isdir(source):
+        paths = sorted(glob.glob(os.path.join(source, "*.csv")))
+    elif glob.has_magic(source):
+        paths = sorted(glob.glob(source))
+    else:
+        return [source]
+    if not paths:
+        raise FileNotFoundError(f"No CSV files match {source}")
+    return paths
+
+
+def read_csv_file(path):
+    return preprocess(pd.read_csv(path))
+
+
+class _FilePrefix(io.RawIOBase):
+    # The first `length` bytes of a file, for parsers that read until EOF
+
+    def __init__(self, path, length):
+        self._file = open(path, "rb")
+        self._left = length
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._file.read(min(len(buffer), self._left))
+        buffer[:len(data)] = data
+        self._left -= len(data)
+        return len(data)
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def open_prefix(path, length=None):
+    # Binary file object over the first `length` bytes of `path` (all of it by default)
+    if length is None:
+        return open(path, "rb")
+    return io.BufferedReader(_FilePrefix(path, length))
+
+
+def read_file(path, length=None):
+    # Preprocessed rows of the first `length` bytes of a CSV file (the file as
+    # it is now by default) and that length, so rows appended afterwards are
+    # read from exactly where this parse stopped
+    length = os.path.getsize(path) if length is None else length
+    with open_prefix(path, length) as f:
+        return preprocess(pd.read_csv(f)), length
+
+
+def read_appended(path, start, end=None):
+    # Preprocessed rows between bytes `start` and `end` (the end of the file by
+    # default) and the offset after them, or (None, start) when there are none.
+    # Only complete lines are read; a partly written last line is left for later.
+    with open(path, "rb") as f:
+        header = f.readline()
+        f.seek(start)
+        appended = f.read() if end is None else f.read(end - start)
+    complete = appended[:appended.rfind(b"\n") + 1]
+    if not complete:
+        return None, start
+    return preprocess(pd.read_csv(io.BytesIO(header + complete))), start + len(complete)
+
+
+def read_source(source=DATA_PATH, workers=LOAD_WORKERS):
+    # Load the CSV file(s) into one preprocessed DataFrame. Shards are parsed
+    # and preprocessed in a process pool; only the compact (categorical)
+    # results travel back, and they are concatenated once, column by column.
+    paths = source_paths(source)
+    workers = min(workers or os.cpu_count() or 1, len(paths))
+    if workers <= 1:
+        return concat_frames([read_csv_file(path) for path in paths])
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return concat_frames(list(pool.map(read_csv_file, paths)))
+
+
+def load_dataset(path=DATA_PATH, use_cache=USE_CACHE):
+    # The on-disk cache is keyed on a single file; sharded sources are parsed each time
+    if not os.path.isfile(path):
+        return read_source(path)
+    base, tail, _, _ = _load_file(path, use_cache)
+    return concat_frames([base, *tail])
+
+
+def _load_file(path, use_cache=USE_CACHE):
+    # (base, tail, generation, offset) for a single file: the base frame
+    # (mapped from the cache, which may predate rows appended since), frames
+    # of the rows after it, the cache generation (None when uncached) and the
+    # bytes of the file they hold
+    if use_cache:
+        base, length, generation = cache.load_cached(path, read_file)
+    else:
+        (base, length), generation = read_file(path), None
+    rows, offset = read_appended(path, length)
+    return base, [] if rows is None else [rows], generation, offset
+
+
+def _load_shared(path):
+    # (base, tail, generation, offset) as _load_file; sharded sources are
+    # parsed whole and hold no offset, as they are not watched
+    if not os.path.isfile(path):
+        return read_source(path), [], None, None
+    return _load_file(path)
+
+
+def concat_frames(frames):
+    # Concatenate preprocessed frames, merging the category sets of categorical
+    # columns so they stay categorical (plain pd.concat falls back to object)
+    frames = [frame for frame in frames if len(frame)] or frames[:1]
+    if len(frames) == 1:
+        return frames[0]
+    first = frames[0]
+    columns = {}
+    for column in first.columns:
+        if isinstance(first[column].dtype, pd.CategoricalDtype):
+            pieces = [frame[column].astype('category') for frame in frames]
+            merged = union_categoricals(pieces, sort_categories=not first[column].cat.ordered)
+            if first[column].cat.ordered:
+                merged = merged.as_ordered()
+            columns[column] = merged
+        else:
+            columns[column] = pd.concat([frame[column] for frame in frames], ignore_index=True)
+    return pd.DataFrame(columns)
+
+
+def add_listener(listener):
+    # listener(new_rows) runs after the shared frame changes and before the
+    # version is bumped: new_rows are the appended rows, or None on a reload
+    _listeners.append(listener)
+
+
+def add_version_listener(listener):
+    # listener(version) runs right after the version is bumped; it is called
+    # with the dataset lock held, so it should only hand work off (e.g. to a thread)
+    _version_listeners.append(listener)
+
+
+def _notify(new_rows):
+    global _version
+    for listener in _listeners:
+        listener(new_rows)
+    _version += 1
+    for listener in _version_listeners:
+        listener(_version)
+
+
+def _ensure_loaded():
+    # Load once per process
+    global _dataset, _tail, _combined, _generation, _offset, _source
+    if _dataset is None:
+        with _lock:
+            if _dataset is None:
+                _dataset, _tail, _generation, _offset = _load_shared(DATA_PATH)
+                _combined, _source = None, DATA_PATH
+                if _tail_rows() >= COMPACT_ROWS:
+                    _compact()
+                _notify(None)
+
+
+def get_frames():
+    # Read-only views of the base frame and of the frames appended after it
+    _ensure_loaded()
+    with _lock:
+        return [frame.copy(deep=False) for frame in [_dataset, *_tail]]
+
+
+def get_columns(columns):
+    # Just `columns` of the shared rows. Without appended rows they are views
+    # of the base frame; otherwise only these columns are concatenated, so
+    # the base frame (mapped from the cache and shared) is never copied.
+    return concat_frames([frame[columns] for frame in get_frames()])
+
+
+def get_dataset():
+    # Read-only view of every row as one frame. After appends this is built
+    # once per change by concatenating the base and the tail; pages that need
+    # only some columns use get_columns instead.
+    global _combined
+    _ensure_loaded()
+    with _lock:
+        if not _tail:
+            return _dataset.copy(deep=False)
+        if _combined is None:
+            _combined = concat_frames([_dataset, *_tail])
+        return _combined.copy(deep=False)
+
+
+def source_offset():
+    # Bytes of the single-file source this process holds, as a frame or as
+    # streamed aggregates; None when nothing is loaded or the source is sharded
+    return _offset
+
+
+def stream_offset(path=DATA_PATH):
+    # Streaming mode: the bytes the streamed aggregates cover, fixed the first
+    # time they are built and moved on by appends and reloads
+    global _offset, _source
+    with _lock:
+        if _offset is None and os.path.isfile(path):
+            _offset, _source = os.path.getsize(path), path
+        return _offset
+
+
+def append_rows(new_rows, offset=None):
+    # Add preprocessed rows appended to the source, ending at byte `offset`.
+    # They go into the tail and the base frame is left as it is; once the tail
+    # holds COMPACT_ROWS rows it is folded into a new base. If the frame was
+    # never loaded (e.g. only streamed aggregates are in use) just let the
+    # listeners fold the rows in.
+    global _dataset, _tail, _combined, _generation, _offset
+    with _lock:
+        if offset is not None:
+            _offset = offset
+        if _dataset is not None:
+            _tail = _tail + [new_rows]
+            _combined = None
+        _notify(new_rows)
+        if _dataset is not None and _tail_rows() >= COMPACT_ROWS:
+            _compact()
+
+
+def _tail_rows():
+    return sum(len(rows) for rows in _tail)
+
+
+def _compact():
+    # Fold the tail into a new base. A cached source gets a new cache
+    # generation holding its first _offset bytes, which is then mapped, so the
+    # rows are shared between processes again; if another process already
+    # cached more, that generation is mapped instead. Called with _lock held.
+    global _dataset, _tail, _combined, _generation
+    if USE_CACHE and _offset is not None:
+        try:
+            meta = cache.store_prefix(_source, lambda: concat_frames([_dataset, *_tail]), _offset)
+        except OSError:
+            meta = None
+        if meta is not None:
+            _remap(meta)
+            return
+    _dataset, _tail, _combined, _generation = concat_frames([_dataset, *_tail]), [], None, None
+
+
+def _remap(meta):
+    # Map the cache generation in `meta` (a prefix of the source) as the base,
+    # keeping the rows this process holds: its rows past the cached bytes are
+    # read again as the tail, and rows the cache holds beyond them are passed
+    # to the listeners as an append. Called with _lock held.
+    global _dataset, _tail, _combined, _generation, _offset
+    if meta is None:
+        return
+    cached = meta["source"]["size"]
+    _dataset, _combined, _generation = cache.read_cache(meta), None, meta["generation"]
+    if cached <= _offset:
+        rows, _ = read_appended(_source, cached, _offset)
+        _tail = [] if rows is None else [rows]
+    else:
+        rows, _ = read_appended(_source, _offset, cached)
+        _tail, _offset = [], cached
+        if rows is not None:
+            _notify(rows)
+
+
+def remap():
+    # Map the newest cache generation of the source in place of the base
+    # without a full reload; False when the cache is no longer a prefix of
+    # the source, in which case reload_dataset is needed
+    meta = cache.lookup(_source)
+    if meta is None or _offset is None:
+        return False
+    with _lock:
+        _remap(meta)
+    return True
+
+
+def reload_dataset(path=DATA_PATH):
+    global _dataset, _tail, _combined, _generation, _offset, _source
+    if CHUNKSIZE and _dataset is None:
+        # Streaming mode holds no frame: bump the version and let the
+        # listeners rebuild the aggregates from the file as it is now
+        with _lock:
+            _offset = os.path.getsize(path) if os.path.isfile(path) else None
+            _source = path
+            _notify(None)
+        return
+    base, tail, generation, offset = _load_shared(path)
+    with _lock:
+        _dataset, _tail, _combined, _generation, _offset, _source = base, tail, None, generation, offset, path
+        if _tail_rows() >= COMPACT_ROWS:
+            _compact()
+        _notify(None)
+
+
+def cache_is_stale():
+    # True when another process (a server worker or `python -m healthcare.cache
+    # --force`) has written a newer cache generation than the one this process
+    # mapped (or a cache at all, when this process compacted in memory); remap
+    # then maps it
+    if _dataset is None or not USE_CACHE or _offset is None:
+        return False
+    current = cache.current_generation(_source)
+    return current is not None and current != _generation
+
+
+def get_version():
+    # Changes whenever the data changes; caches key on it. The SQLite backend
+    # serves a fixed snapshot, and in streaming mode the version moves with
+    # the watcher's appends and reloads, so neither loads the frame here.
+    if _dataset is None and BACKEND != "sqlite" and not CHUNKSIZE:
+        get_dataset()
+    return _version
+
+
+def memory_report(path=DATA_PATH):
+    # Bytes per column for the preprocessed frame before and after compaction
+    raw = pd.concat([pd.read_csv(file) for file in source_paths(path)], ignore_index=True)
+    before = preprocess(raw.copy(), compact_columns=False).memory_usage(deep=True, index=False)
+    after = preprocess(raw, compact_columns=True).memory_usage(deep=True, index=False)
+    report = pd.DataFrame({'before': before, 'after': after})
+    report.loc['Total'] = report.sum()
+    report['ratio'] = (report['before'] / report['after']).round(1)
+    return report
+
+
+def benchmark_load(source=DATA_PATH, worker_counts=(1, 2, 4, 8)):
+    # Seconds to read and preprocess `source` with each number of workers,
+    # and the speedup over a single process
+    timings = []
+    for workers in worker_counts:
+        start = time.perf_counter()
+        read_source(source, workers)
+        timings.append(time.perf_counter() - start)
+    report = pd.DataFrame({'workers': list(worker_counts), 'seconds': timings})
+    report['speedup'] = (report['seconds'].iloc[0] / report['seconds']).round(2)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect the preprocessed dataset.")
+    parser.add_argument("--source", default=DATA_PATH, help="CSV file, directory of CSV shards or glob to preprocess")
+    parser.add_argument("--memory-report", action="store_true", help="print bytes per column before and after compaction")
+    parser.add_argument("--benchmark", type=int, nargs="+", metavar="WORKERS",
+                        help="time loading the source with each number of worker processes")
+    args = parser.parse_args(argv)
+
+    if args.benchmark:
+        print(benchmark_load(args.source, args.benchmark).to_string(index=False))
+    elif args.memory_report:
+        print(memory_report(args.source).to_string())
+    else:
+        df = load_dataset(args.source)
+        print(f"{len(df)} rows, {df.memory_usage(deep=True).sum()} bytes")
+
+
+if __name__ == "__main__":
+    main()
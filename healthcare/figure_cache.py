@@ -0,0 +1,207 @@
+import functools
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+from dash import _callback
+from plotly.io.json import to_json_plotly
+
+from healthcare.dataset import get_version
+from healthcare.payload import compact_value
+
+
+class FigureCache:
+    # LRU cache of callback outputs, bounded both by entry count and by the
+    # total size of their JSON.
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size):
+        # `size` is the length of the value's JSON
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+figure_cache = FigureCache(
+    max_entries=int(os.environ.get("HEALTHCARE_FIGURE_CACHE_ENTRIES", 256)),
+    max_bytes=int(float(os.environ.get("HEALTHCARE_FIGURE_CACHE_MB", 64)) * 1024 * 1024),
+)
+
+
+# Placeholders for SerializedOutput payloads while Dash encodes a response
+_splice = threading.local()
+_PLACEHOLDER = f"serialized-output-{uuid.uuid4().hex}"
+
+
+class SerializedOutput:
+    # A callback output already encoded as JSON. Dash's callback encoder
+    # copies the text into the response as it is (see install_figure_cache);
+    # any other encoder gets the decoded value from to_plotly_json().
+    __slots__ = ("payload",)
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def to_plotly_json(self):
+        pending = getattr(_splice, "pending", None)
+        if pending is None:
+            return json.loads(self.payload)
+        pending.append(self.payload)
+        return f"{_PLACEHOLDER}-{len(pending) - 1}"
+
+
+def _splicing_to_json(to_json):
+    # Dash serialises callback responses (page layouts included) through
+    # dash._callback.to_json; SerializedOutputs met on the way become
+    # placeholders, which are then replaced by their JSON text
+    @functools.wraps(to_json)
+    def wrapper(value):
+        _splice.pending = []
+        try:
+            text = to_json(value)
+            pending = _splice.pending
+        finally:
+            _splice.pending = None
+        for i, payload in enumerate(pending):
+            text = text.replace(f'"{_PLACEHOLDER}-{i}"', payload, 1)
+        return text
+
+    return wrapper
+
+
+def install_figure_cache(app):
+    # Let cached callback outputs go into responses without being decoded
+    # and encoded again; without this they still work, through to_plotly_json
+    if not getattr(_callback.to_json, "splices_serialized", False):
+        _callback.to_json = _splicing_to_json(_callback.to_json)
+        _callback.to_json.splices_serialized = True
+
+
+def cached_callback(func):
+    # Memoise a callback by its input values and the dataset version. The
+    # output is stored as JSON with its figures compacted, one SerializedOutput
+    # per output when a tuple or list is returned, so a hit skips building,
+    # compacting and serialising the figures and Dash never parses them.
+    name = f"{func.__module__}.{func.__qualname__}"
+
+    @functools.wraps(func)
+    def wrapper(*args):
+        key = (name, get_version(), json.dumps(args, sort_keys=True, default=str))
+        output = figure_cache.get(key)
+        if output is None:
+            value = compact_value(func(*args))
+            if isinstance(value, (list, tuple)):
+                output = type(value)(SerializedOutput(to_json_plotly(item)) for item in value)
+                size = sum(len(item.payload) for item in output)
+            else:
+                output = SerializedOutput(to_json_plotly(value))
+                size = len(output.payload)
+            figure_cache.put(key, output, size)
+        return output
+
+    return wrapper
+
+
+# Builders memoised with per_dataset_version, by name, for the pre-warmer
+version_builders = {}
+
+# Set while a thread runs a refresh, so builders it calls are rebuilt as well
+_local = threading.local()
+
+# Called with a builder's name when its previous build is served while the
+# dataset has moved on; see serve_stale_builds
+_on_stale = None
+
+
+def serve_stale_builds(on_stale):
+    # Let per_dataset_version builders return their previous build after a
+    # dataset change instead of rebuilding in the request, and call
+    # on_stale(name) so that something (healthcare.prewarm) rebuilds them
+    global _on_stale
+    _on_stale = on_stale
+
+
+def per_dataset_version(func):
+    # Memoise a zero-argument builder (e.g. a page layout) until the dataset
+    # version changes. Concurrent first callers wait for a single build.
+    # wrapper.refresh() builds for the current version even when stale builds
+    # are being served; the new build replaces the old one in one assignment.
+    name = f"{func.__module__}.{func.__qualname__}"
+    lock = threading.Lock()
+    state = {"entry": None}
+
+    def refresh():
+        version = get_version()
+        entry = state["entry"]
+        if entry is None or entry[0] != version:
+            with lock:
+                entry = state["entry"]
+                if entry is None or entry[0] != version:
+                    outer = getattr(_local, "refreshing", False)
+                    _local.refreshing = True
+                    try:
+                        entry = (version, func())
+                    finally:
+                        _local.refreshing = outer
+                    state["entry"] = entry
+        return entry[1]
+
+    @functools.wraps(func)
+    def wrapper():
+        entry = state["entry"]
+        on_stale = _on_stale
+        if (entry is not None and on_stale is not None and entry[0] != get_version()
+                and not getattr(_local, "refreshing", False)):
+            on_stale(name)
+            return entry[1]
+        return refresh()
+
+    wrapper.refresh = refresh
+    wrapper.has_build = lambda: state["entry"] is not None
+    version_builders[name] = wrapper
+    return wrapper
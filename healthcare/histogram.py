@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+
+
+def nice_edges(low, high, bins=10):
+    # Edges of about `bins` equal-width bins covering [low, high]. As with
+    # Plotly's nbins, the width is 1, 2 or 5 times a power of ten and the
+    # first edge is a multiple of it.
+    raw = (high - low) / bins
+    if raw <= 0:
+        width = 1.0
+    else:
+        magnitude = 10 ** np.floor(np.log10(raw))
+        width = next(step * magnitude for step in (1, 2, 5, 10) if step * magnitude >= raw)
+    start = np.floor(low / width) * width
+    count = int((high - start) // width) + 1
+    edges = start + width * np.arange(count + 1)
+    if edges[-1] <= high:
+        # (high - start) // width rounded down a whole number of fractional widths
+        edges = np.append(edges, edges[-1] + width)
+    return edges
+
+
+# Cells of the fine grid counts are kept on; the grid step is the power of
+# ten (at least 1) giving about this many cells over the column's range
+GRID_CELLS = 4096
+
+
+class BinnedDistribution:
+    # The values of one numeric column, sorted once overall and once per group
+    # (e.g. per gender), plus the number of values below every point of a
+    # fixed fine grid. The grid step is a power of ten no smaller than 1, so
+    # the edges nice_edges draws at that width or wider are grid points
+    # (exactly, as whole numbers) and a request's bin counts are a slice of
+    # the cumulative counts and a difference. The only search is for the
+    # upper bound. Bins narrower than the grid fall back to a binary search
+    # per edge.
+
+    def __init__(self, values, groups=None, cells=GRID_CELLS):
+        values = np.asarray(values, dtype=float)
+        present = ~np.isnan(values)
+        values = values[present]
+        self.values = np.sort(values)
+        self.groups = {}
+        if groups is not None:
+            # Groups keep their order of first appearance, as Plotly colours them
+            codes, names = pd.factorize(np.asarray(groups, dtype=object)[present])
+            for code, name in enumerate(names):
+                self.groups[name] = np.sort(values[codes == code])
+
+        if len(self.values):
+            span = self.values[-1] - self.values[0]
+            self.step = 10.0 ** max(0, np.floor(np.log10(span / cells))) if span > 0 else 1.0
+            self.grid_start = np.floor(self.values[0] / self.step) * self.step
+            size = int((self.values[-1] - self.grid_start) // self.step) + 2
+        else:
+            self.step, self.grid_start, size = 1.0, 0.0, 1
+        grid = self.grid_start + self.step * np.arange(size)
+        # below[group][i]: values of the group below grid[i]
+        self.below = {name: np.searchsorted(group_values, grid, side='left')
+                      for name, group_values in [(None, self.values), *self.groups.items()]}
+
+    @classmethod
+    def from_frame(cls, df, column, by=None):
+        return cls(pd.to_numeric(df[column], errors='coerce'), None if by is None else df[by])
+
+    def sorted_values(self, group=None, upper=None):
+        # Sorted values of the group (every value when None) up to `upper`, as a view
+        values = self.values if group is None else self.groups.get(group, self.values[:0])
+        if upper is not None:
+            values = values[:np.searchsorted(values, upper, side='right')]
+        return values
+
+    def edges(self, group=None, upper=None, bins=10):
+        values = self.sorted_values(group, upper)
+        if not len(values):
+            return np.empty(0)
+        return nice_edges(values[0], values[-1], bins)
+
+    def counts(self, edges, group=None, upper=None):
+        # Values in each [edges[i], edges[i + 1]) bin
+        if not len(edges):
+            return np.empty(0, dtype=np.int64)
+        values = self.sorted_values(group, upper)
+        below = self.below.get(group)
+        positions = (np.asarray(edges) - self.grid_start) / self.step
+        cells = positions.astype(np.int64)
+        if below is None or not np.array_equal(cells, positions):
+            return np.diff(np.searchsorted(values, edges, side='left'))
+        # Values below an edge and no greater than `upper` are the shorter of two prefixes
+        return np.diff(np.minimum(below.take(cells, mode='clip'), len(values)))
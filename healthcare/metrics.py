@@ -0,0 +1,212 @@
+import cProfile
+import functools
+import os
+import random
+import threading
+import time
+
+import dash
+import flask
+from dash import _callback
+from dash.exceptions import PreventUpdate
+
+from healthcare.figure_cache import figure_cache
+
+# Set HEALTHCARE_PROFILE_DIR to dump a cProfile of a sample of callback calls
+# there, one .prof file per profiled call; HEALTHCARE_PROFILE_SAMPLE is the
+# fraction of calls profiled
+PROFILE_DIR = os.environ.get("HEALTHCARE_PROFILE_DIR")
+PROFILE_SAMPLE = float(os.environ.get("HEALTHCARE_PROFILE_SAMPLE", 0.01))
+
+SECONDS_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+BYTES_BUCKETS = [1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+
+
+class Histogram:
+    # Prometheus-style histogram: cumulative bucket counts, sum and count per
+    # label value
+
+    def __init__(self, name, help_text, label, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_value, series in sorted(self._series.items()):
+                label = f'{self.label}="{_escape(label_value)}"'
+                for bound, count in zip(self.buckets, series["buckets"]):
+                    lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {count}')
+                lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {series["count"]}')
+                lines.append(f"{self.name}_sum{{{label}}} {series['sum']}")
+                lines.append(f"{self.name}_count{{{label}}} {series['count']}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, label):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_value, amount=1):
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_value, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{{{self.label}="{_escape(label_value)}"}} {value}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+callback_seconds = Histogram(
+    "healthcare_callback_duration_seconds", "Wall time of a callback, serialisation included.",
+    "callback", SECONDS_BUCKETS)
+serialization_seconds = Histogram(
+    "healthcare_callback_serialization_seconds", "Time spent serialising a callback's output to JSON.",
+    "callback", SECONDS_BUCKETS)
+response_bytes = Histogram(
+    "healthcare_callback_response_bytes", "Size of a callback's JSON response.",
+    "callback", BYTES_BUCKETS)
+callback_errors = Counter(
+    "healthcare_callback_errors_total", "Callbacks that raised an exception.", "callback")
+layout_seconds = Histogram(
+    "healthcare_layout_duration_seconds", "Wall time of a page layout render.", "page", SECONDS_BUCKETS)
+layout_errors = Counter(
+    "healthcare_layout_errors_total", "Page layout renders that raised an exception.", "page")
+
+METRICS = [callback_seconds, serialization_seconds, response_bytes, callback_errors, layout_seconds, layout_errors]
+
+_local = threading.local()
+
+
+def _timed_to_json(to_json):
+    # Dash serialises callback outputs through dash._callback.to_json; timing
+    # it separates serialisation from the callback's own work
+    @functools.wraps(to_json)
+    def wrapper(value):
+        start = time.perf_counter()
+        try:
+            return to_json(value)
+        finally:
+            _local.serialize_seconds = getattr(_local, "serialize_seconds", 0.0) + time.perf_counter() - start
+
+    return wrapper
+
+
+def _profile_path(label):
+    safe_label = "".join(c if c.isalnum() or c in "-_." else "_" for c in label)
+    return os.path.join(PROFILE_DIR, f"{safe_label}-{time.time_ns()}-{os.getpid()}.prof")
+
+
+def instrument_callback(label, func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        _local.serialize_seconds = 0.0
+        profiler = cProfile.Profile() if PROFILE_DIR and random.random() < PROFILE_SAMPLE else None
+        start = time.perf_counter()
+        try:
+            if profiler is not None:
+                result = profiler.runcall(func, *args, **kwargs)
+            else:
+                result = func(*args, **kwargs)
+        except PreventUpdate:
+            raise
+        except Exception:
+            callback_errors.inc(label)
+            raise
+        finally:
+            if profiler is not None:
+                os.makedirs(PROFILE_DIR, exist_ok=True)
+                profiler.dump_stats(_profile_path(label))
+        callback_seconds.observe(label, time.perf_counter() - start)
+        serialization_seconds.observe(label, _local.serialize_seconds)
+        if isinstance(result, (str, bytes)):
+            response_bytes.observe(label, len(result))
+        return result
+
+    wrapper.instrumented = True
+    return wrapper
+
+
+def instrument_layout(label, layout):
+    @functools.wraps(layout)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return layout(*args, **kwargs)
+        except Exception:
+            layout_errors.inc(label)
+            raise
+        finally:
+            layout_seconds.observe(label, time.perf_counter() - start)
+
+    wrapper.instrumented = True
+    return wrapper
+
+
+def _instrument_registered(app):
+    # Wrap callbacks and page layouts not wrapped yet. Dash moves callbacks
+    # declared with dash.callback into app.callback_map on the first request,
+    # so this runs before every request and is a no-op once all are wrapped.
+    for entry in app.callback_map.values():
+        # Clientside callbacks have no server function
+        func = entry.get("callback")
+        if func is not None and not getattr(func, "instrumented", False):
+            entry["callback"] = instrument_callback(f"{func.__module__}.{func.__name__}", func)
+    for page in dash.page_registry.values():
+        layout = page.get("layout")
+        if callable(layout) and not getattr(layout, "instrumented", False):
+            page["layout"] = instrument_layout(page["module"], layout)
+
+
+def render_metrics():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    stats = figure_cache.stats()
+    for key in ("hits", "misses", "evictions"):
+        lines.append(f"# TYPE healthcare_figure_cache_{key}_total counter")
+        lines.append(f"healthcare_figure_cache_{key}_total {stats[key]}")
+    for key in ("entries", "bytes"):
+        lines.append(f"# TYPE healthcare_figure_cache_{key} gauge")
+        lines.append(f"healthcare_figure_cache_{key} {stats[key]}")
+    return "\n".join(lines) + "\n"
+
+
+def install_metrics(app):
+    # Time every callback and page layout of `app` and serve the results at
+    # /metrics in the Prometheus text format
+    if not getattr(_callback.to_json, "instrumented", False):
+        _callback.to_json = _timed_to_json(_callback.to_json)
+        _callback.to_json.instrumented = True
+    app.server.before_request(lambda: _instrument_registered(app))
+
+    @app.server.route("/metrics")
+    def metrics():
+        return flask.Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+    return app
@@ -0,0 +1,175 @@
+import base64
+import datetime
+import gzip
+import json
+import os
+
+import flask
+import numpy as np
+from plotly.basedatatypes import BaseFigure
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; responses fall back to gzip
+    brotli = None
+
+# Floats are rounded to display precision before encoding: SIGNIFICANT digits,
+# but never fewer than DECIMALS decimals (cents, fractions of a day), so large
+# amounts keep their cents and sub-unit values such as correlations keep their
+# leading digits. float32 is used when it still rounds back to the same values.
+DECIMALS = 2
+SIGNIFICANT = 4
+
+# Shorter arrays stay plain JSON lists; base64 only pays off for longer ones
+MIN_TYPED_ARRAY = 8
+
+# Set HEALTHCARE_COMPRESS=0 to serve callback and layout responses uncompressed
+COMPRESS = os.environ.get("HEALTHCARE_COMPRESS", "1") != "0"
+COMPRESS_MIN_BYTES = 1024
+COMPRESSIBLE_TYPES = ("application/json", "text/html", "text/plain")
+
+INT_DTYPES = [np.int8, np.uint8, np.int16, np.uint16, np.int32, np.uint32]
+
+
+def _typed_array(values):
+    # {'dtype', 'bdata'[, 'shape']}: the base64 typed-array form plotly.js
+    # decodes straight into a TypedArray
+    spec = {"dtype": values.dtype.str.lstrip("<>|="), "bdata": base64.b64encode(values.tobytes()).decode("ascii")}
+    if values.ndim > 1:
+        spec["shape"] = ",".join(str(n) for n in values.shape)
+    return spec
+
+
+def round_display(values):
+    # Round each float to display precision (see SIGNIFICANT and DECIMALS)
+    values = np.asarray(values, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        magnitude = np.floor(np.log10(np.abs(values)))
+        magnitude[~np.isfinite(magnitude)] = 0
+        # Capped so the scale stays finite for denormal values
+        decimals = np.clip(SIGNIFICANT - 1 - magnitude, DECIMALS, 300)
+        scale = 10.0 ** decimals
+        return np.round(values * scale) / scale
+
+
+def _typed_numbers(values):
+    if values.dtype.kind in "iu":
+        values = values.astype(np.int64)
+        if values.size:
+            low, high = values.min(), values.max()
+            for dtype in INT_DTYPES:
+                info = np.iinfo(dtype)
+                if info.min <= low and high <= info.max:
+                    return _typed_array(values.astype(dtype))
+        return _typed_array(values.astype(np.float64))
+    as_float32 = values.astype(np.float32)
+    if np.array_equal(round_display(as_float32), values):
+        return _typed_array(as_float32)
+    return _typed_array(values)
+
+
+def _encode_numbers(values):
+    # Rounded values as a typed array, or as a plain list when that is shorter
+    # (small integers take fewer characters as JSON text than as base64)
+    if values.dtype.kind == "f":
+        values = round_display(values)
+        if not np.isfinite(values).all():
+            # NaN gaps and infinities keep their JSON meaning (null) as plain lists
+            return None if np.isinf(values).any() else np.where(np.isnan(values), None, values).tolist()
+    typed = _typed_numbers(values)
+    plain = values.tolist()
+    return plain if len(json.dumps(plain)) <= len(typed["bdata"]) + 30 else typed
+
+
+def _encode_dates(values):
+    # Midnight-only dates go out as YYYY-MM-DD instead of full ISO timestamps
+    values = values.astype("datetime64[ns]")
+    unit = "D" if (values[~np.isnat(values)].astype(np.int64) % (86400 * 10 ** 9) == 0).all() else "ms"
+    return np.datetime_as_string(values, unit=unit).tolist()
+
+
+def compact_array(value):
+    # Compact encoding of a data array, or None to leave it as it is
+    if isinstance(value, (list, tuple)):
+        if len(value) < MIN_TYPED_ARRAY or not all(
+                isinstance(v, (int, float, np.number)) and not isinstance(v, bool) for v in value):
+            return None
+        value = np.asarray(value)
+    if not isinstance(value, np.ndarray) or value.size < MIN_TYPED_ARRAY or value.ndim > 2:
+        return None
+    if value.dtype.kind in "iuf":
+        return _encode_numbers(value)
+    if value.dtype.kind == "M":
+        return _encode_dates(value)
+    if value.dtype == object and isinstance(value.flat[0], (datetime.date, np.datetime64)):
+        try:
+            return _encode_dates(value.astype("datetime64[ns]"))
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+def _compact_node(node):
+    if isinstance(node, dict):
+        return {key: _compact_node(value) for key, value in node.items()}
+    compacted = compact_array(node)
+    if compacted is not None:
+        return compacted
+    if isinstance(node, (list, tuple)):
+        return [_compact_node(value) for value in node]
+    return node
+
+
+def compact_figure(fig):
+    # Figure dict with numeric trace arrays as rounded base64 typed arrays
+    # and dates trimmed to the day; the layout is left untouched
+    fig_dict = fig.to_plotly_json() if isinstance(fig, BaseFigure) else fig
+    return {**fig_dict, "data": [_compact_node(trace) for trace in fig_dict.get("data", [])]}
+
+
+def compact_value(value):
+    # Compact any figures in a callback's return value (a figure or a tuple of outputs)
+    if isinstance(value, BaseFigure):
+        return compact_figure(value)
+    if isinstance(value, (list, tuple)):
+        return type(value)(compact_value(item) for item in value)
+    return value
+
+
+def compact_graphs(component):
+    # Compact the figure of every dcc.Graph in a layout tree, in place
+    if type(component).__name__ == "Graph" and isinstance(getattr(component, "figure", None), BaseFigure):
+        component.figure = compact_figure(component.figure)
+    children = getattr(component, "children", None)
+    for child in children if isinstance(children, (list, tuple)) else [children]:
+        if hasattr(child, "to_plotly_json"):
+            compact_graphs(child)
+    return component
+
+
+def _compress_response(response):
+    accepted = flask.request.headers.get("Accept-Encoding", "")
+    if (response.direct_passthrough or response.status_code != 200 or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return response
+    if brotli is not None and "br" in accepted:
+        response.set_data(brotli.compress(body, quality=5))
+        response.headers["Content-Encoding"] = "br"
+    elif "gzip" in accepted:
+        response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers["Content-Encoding"] = "gzip"
+    else:
+        return response
+    response.headers["Vary"] = "Accept-Encoding"
+    return response
+
+
+def install_compression(app):
+    # Compress JSON and HTML responses (callbacks, layouts, the index page)
+    # with brotli when installed and the client accepts it, else gzip
+    if COMPRESS:
+        app.server.after_request(_compress_response)
+    return app
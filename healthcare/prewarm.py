@@ -0,0 +1,122 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import flask
+
+from healthcare import dataset
+from healthcare.figure_cache import serve_stale_builds, version_builders
+
+logger = logging.getLogger(__name__)
+
+# Threads rebuilding page figures after a dataset change; HEALTHCARE_PREWARM_WORKERS=0
+# turns pre-warming off, so the first visitor after a change rebuilds the page
+PREWARM_WORKERS = int(os.environ.get("HEALTHCARE_PREWARM_WORKERS", 4))
+
+
+class Prewarmer:
+    # Rebuilds the per_dataset_version builders (page layouts and the tables
+    # and timelines behind them) concurrently whenever the dataset version
+    # changes. Until a builder's new build is ready, requests are served its
+    # previous one. Requests arriving during a run are coalesced into one
+    # follow-up run for the latest version. Only builders that were built
+    # before are rebuilt, unless a run asks for everything (at startup), so a
+    # change never loads data no page has asked for (e.g. in streaming mode).
+
+    def __init__(self, workers=PREWARM_WORKERS):
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pending = False
+        self._everything = False
+        self._latest_version = None
+        self._status = {"state": "idle", "version": None, "runs": 0, "builders": {}}
+
+    def on_version(self, version):
+        # Dataset version listener
+        self._latest_version = version
+        self.schedule()
+
+    def schedule(self, *_, everything=False):
+        # Start a run in the background, or queue one after the current run
+        if self.workers <= 0:
+            return
+        with self._lock:
+            self._pending = True
+            self._everything = self._everything or everything
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="prewarm", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._status["state"] = "idle"
+                    self._thread = None
+                    return
+                self._pending = False
+                everything, self._everything = self._everything, False
+                self._status["state"] = "warming"
+            self.warm(everything)
+
+    def warm(self, everything=True):
+        # Rebuild the builders for the current version and record the outcome
+        version = dataset.get_version()
+        started = time.time()
+        start = time.perf_counter()
+        builders = {name: builder for name, builder in version_builders.items()
+                    if everything or builder.has_build()}
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="prewarm") as pool:
+            timings = dict(zip(builders, pool.map(self._build, builders.values())))
+        with self._lock:
+            self._status.update({
+                "version": version,
+                "runs": self._status["runs"] + 1,
+                "started": started,
+                "seconds": time.perf_counter() - start,
+                "builders": timings,
+            })
+        failed = [name for name, timing in timings.items() if "error" in timing]
+        logger.info("Pre-warmed %d builders for dataset version %d in %.1fs%s", len(timings), version,
+                    time.perf_counter() - start, f" ({len(failed)} failed)" if failed else "")
+
+    @staticmethod
+    def _build(builder):
+        start = time.perf_counter()
+        try:
+            builder.refresh()
+        except Exception as error:
+            logger.exception("Pre-warming %s failed", builder.__name__)
+            return {"seconds": time.perf_counter() - start, "error": repr(error)}
+        return {"seconds": time.perf_counter() - start}
+
+    def wait(self, timeout=None):
+        # Block until the current run (and any queued after it) has finished
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def status(self):
+        with self._lock:
+            return {**self._status, "latest_version": self._latest_version, "workers": self.workers}
+
+
+prewarmer = Prewarmer()
+
+
+def install_prewarm(app):
+    # Rebuild page figures in the background after every dataset change,
+    # serving the previous figures meanwhile, and report progress at /prewarm
+    if PREWARM_WORKERS > 0:
+        serve_stale_builds(prewarmer.schedule)
+        dataset.add_version_listener(prewarmer.on_version)
+
+    @app.server.route("/prewarm")
+    def prewarm_status():
+        return flask.jsonify(prewarmer.status())
+
+    return app
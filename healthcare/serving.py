@@ -0,0 +1,34 @@
+import gc
+import logging
+import time
+
+import dash
+
+from healthcare import aggregates, dataset
+from healthcare.prewarm import prewarmer
+from healthcare.store import SQLITE_BACKEND
+from healthcare.watcher import prepare_watcher
+
+logger = logging.getLogger(__name__)
+
+
+def preload():
+    # Load the dataset, build the aggregates and render every page once so
+    # the memoised figures exist before a pre-forking server starts workers.
+    # The objects are then frozen out of the garbage collector: collections in
+    # the workers no longer write to them, so their pages stay shared
+    # copy-on-write instead of being copied into every worker.
+    start = time.perf_counter()
+    if not aggregates.CHUNKSIZE and not SQLITE_BACKEND:
+        dataset.get_dataset()
+    aggregates.get_aggregates()
+    for page in dash.page_registry.values():
+        if callable(page["layout"]):
+            page["layout"]()
+    prepare_watcher()
+    # The first load schedules a background pre-warm; threads do not survive
+    # the fork, so let it finish here
+    prewarmer.wait()
+    gc.collect()
+    gc.freeze()
+    logger.info("Preloaded the dataset and %d pages in %.1fs", len(dash.page_registry), time.perf_counter() - start)
@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+
+
+class QuantileHistogram:
+    # Mergeable quantile sketch: a histogram of values rounded to a fixed
+    # resolution. Memory grows with the number of distinct rounded values,
+    # not with the number of rows, and two sketches merge by adding counts.
+    #
+    # Error bound: ranks are exact, so every quantile is the quantile of the
+    # rounded data and differs from the exact one by at most resolution / 2.
+    # Length of stay is a whole number of days, so with the default
+    # resolution of 1 its quantiles are exact.
+
+    def __init__(self, values, counts, resolution=1.0):
+        order = np.argsort(values)
+        self.values = np.asarray(values, dtype=float)[order]
+        self.counts = np.asarray(counts, dtype=np.int64)[order]
+        self.resolution = resolution
+        self.cumulative = np.cumsum(self.counts)
+
+    @classmethod
+    def from_values(cls, values, resolution=1.0):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        rounded = np.round(values / resolution) * resolution
+        unique, counts = np.unique(rounded, return_counts=True)
+        return cls(unique, counts, resolution)
+
+    @classmethod
+    def from_counts(cls, counts, resolution=1.0):
+        # From a Series of counts indexed by value (e.g. a groupby().size())
+        counts = counts[counts > 0]
+        return cls(counts.index.to_numpy(dtype=float), counts.to_numpy(), resolution)
+
+    def merge(self, other):
+        merged = pd.Series(self.counts, index=self.values).add(
+            pd.Series(other.counts, index=other.values), fill_value=0)
+        return QuantileHistogram(merged.index.to_numpy(), merged.to_numpy(), self.resolution)
+
+    @property
+    def count(self):
+        return int(self.cumulative[-1]) if len(self.cumulative) else 0
+
+    def _value_at(self, rank):
+        # Value of the rank-th (0-based) element of the sorted data
+        return self.values[np.searchsorted(self.cumulative, rank, side='right')]
+
+    def quantile(self, q):
+        # Linear interpolation at rank q * n - 0.5, clamped to the data, as
+        # plotly.js computes box plot quartiles (quartilemethod="linear");
+        # numpy.quantile's (n - 1) * q would draw different boxes than px.box
+        if not self.count:
+            return float('nan')
+        position = min(max(q * self.count - 0.5, 0), self.count - 1)
+        lower = int(np.floor(position))
+        upper = min(lower + 1, self.count - 1)
+        low_value = self._value_at(lower)
+        return float(low_value + (self._value_at(upper) - low_value) * (position - lower))
+
+    def box_stats(self, max_outliers=50):
+        # Quartiles, Tukey fences (most extreme values within 1.5 IQR of the
+        # box) and up to max_outliers of the most extreme values outside them
+        q1, median, q3 = (self.quantile(q) for q in (0.25, 0.5, 0.75))
+        iqr = q3 - q1
+        inside = (self.values >= q1 - 1.5 * iqr) & (self.values <= q3 + 1.5 * iqr)
+        outliers = self.values[~inside]
+        if len(outliers) > max_outliers:
+            distance = np.abs(outliers - median)
+            outliers = outliers[np.sort(np.argpartition(-distance, max_outliers - 1)[:max_outliers])]
+        return {
+            'q1': q1,
+            'median': median,
+            'q3': q3,
+            'lowerfence': float(self.values[inside].min()),
+            'upperfence': float(self.values[inside].max()),
+            'mean': float(np.dot(self.values, self.counts) / self.count),
+            'outliers': outliers,
+        }
+
+
+class HeavyHitters:
+    # Mergeable top-K summary: at most `capacity` items are tracked, each
+    # with its count per breakdown value (e.g. admissions per blood type for
+    # one doctor). Items are counted exactly within each frame (a groupby);
+    # when a merge leaves more than `capacity` items, the largest totals are
+    # kept by partial selection (nlargest) and the rest are dropped. Unlike
+    # Space-Saving or Misra-Gries, counts are never estimated: a dropped
+    # item's count only adds to `error`.
+    #
+    # Error bound: a tracked count is never too high, and the true count of
+    # any item is at most its tracked count (0 if untracked) plus `error`,
+    # the sum of the largest totals dropped by each pruning. A summary built
+    # in one pass over the whole frame is exact for every tracked item.
+    # Breakdown totals (`column_totals`) are always exact, so the "Other"
+    # bucket holds everything outside the reported items.
+
+    def __init__(self, table, column_totals, capacity, error=0):
+        self.table = table
+        self.column_totals = column_totals
+        self.capacity = capacity
+        self.error = error
+        self._prune()
+
+    @classmethod
+    def from_counts(cls, counts, capacity):
+        # From a Series of counts indexed by (item, breakdown value)
+        table = counts.unstack(fill_value=0)
+        return cls(table, table.sum(), capacity)
+
+    def _prune(self):
+        if len(self.table) <= self.capacity:
+            return
+        totals = self.table.sum(axis=1).nlargest(self.capacity + 1)
+        self.error += totals.iloc[-1]
+        self.table = self.table.loc[totals.index[:-1]]
+
+    def merge(self, other):
+        table = self.table.add(other.table, fill_value=0).fillna(0).astype(np.int64)
+        column_totals = self.column_totals.add(other.column_totals, fill_value=0).astype(np.int64)
+        return HeavyHitters(table, column_totals, max(self.capacity, other.capacity), self.error + other.error)
+
+    def top(self, k, other='Other'):
+        # Counts of the k largest items per breakdown value, largest item first,
+        # followed by an `other` row with the remaining counts; indexed by
+        # (item, breakdown value) like DatasetAggregates.counts()
+        totals = self.table.sum(axis=1).nlargest(k)
+        top = self.table.loc[totals.index].reindex(columns=self.column_totals.index, fill_value=0).sort_index(axis=1)
+        rest = self.column_totals.sort_index() - top.sum()
+        if rest.any():
+            top.loc[other] = rest
+        return top.stack()
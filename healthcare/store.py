@@ -0,0 +1,434 @@
+import argparse
+import json
+import math
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from healthcare import cache, dataset
+from healthcare.table import split_filter_part
+from healthcare.timeline import DAY, TIMELINE_COLUMNS
+
+# HEALTHCARE_BACKEND=sqlite serves the pages from an indexed SQLite copy of the
+# data: their group-bys, counts and means run as SQL, so no worker holds the
+# admissions in memory and the data can outgrow RAM. The database is built
+# from the source on first use (or with `python -m healthcare.store`) and is
+# a snapshot: rebuild it and restart the server to pick up new admissions.
+SQLITE_BACKEND = dataset.BACKEND == "sqlite"
+
+# The database holds patient records, so it lives next to the dataset cache
+# and never under assets/, which Dash serves to anyone
+DB_PATH = os.environ.get("HEALTHCARE_SQLITE_PATH", os.path.join(cache.CACHE_DIR, "healthcare.sqlite3"))
+
+# Read-only connections kept per process; match the server's threads per worker
+POOL_SIZE = int(os.environ.get("HEALTHCARE_SQLITE_POOL", 4))
+
+# Bytes of the database each connection memory-maps; mapped pages are shared
+# by every worker through the page cache
+MMAP_BYTES = int(os.environ.get("HEALTHCARE_SQLITE_MMAP_MB", 1024)) * 1024 * 1024
+
+TABLE = "admissions"
+STORE_FORMAT = 2
+INGEST_CHUNK = 100_000
+
+# Admission year, stored so the year totals can be grouped through an index
+YEAR_COLUMN = "Admission Year"
+
+# Dates are stored as sortable text
+DATE_COLUMNS = ['Date of Admission', 'Discharge Date']
+SQL_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Covering indexes: each lists the group-by columns of a page aggregation
+# followed by the columns it sums, so the aggregation reads only the index
+INDEXES = [
+    ('Insurance Provider',),
+    ('Blood Type', 'Age Group'),
+    ('Blood Type', 'Length of Stay (Days)'),
+    ('Age Group', 'Insurance Provider'),
+    ('Doctor', 'Blood Type'),
+    ('Hospital', 'Blood Type'),
+    ('Hospital', 'Insurance Provider'),
+    ('Medical Condition', 'Length of Stay (Days)'),
+    (YEAR_COLUMN, 'Billing Amount'),
+    ('Date of Admission', 'Medical Condition', 'Billing Amount'),
+]
+
+
+def quote_name(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _source_files(source):
+    # Size and mtime of every file of the source; a change to any means the
+    # database is stale
+    return [
+        {"path": os.path.abspath(path), "size": os.stat(path).st_size, "mtime_ns": os.stat(path).st_mtime_ns}
+        for path in dataset.source_paths(source)
+    ]
+
+
+def _to_sql_frame(df):
+    # Preprocessed frame with the stored column types: dates as text, the age
+    # group as its label and the admission year and month added
+    df = df.copy()
+    df[YEAR_COLUMN] = df['Date of Admission'].dt.year.astype('Int64')
+    df[dataset.MONTH_COLUMN] = dataset.month_number(df['Date of Admission'])
+    for column in DATE_COLUMNS:
+        df[column] = df[column].dt.strftime(SQL_DATE_FORMAT)
+    df['Age Group'] = df['Age Group'].astype(object)
+    return df
+
+
+def _column_kinds(df):
+    kinds = {}
+    for column in df.columns:
+        if column in DATE_COLUMNS:
+            kinds[column] = "date"
+        elif pd.api.types.is_numeric_dtype(df[column]) and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            kinds[column] = "number"
+        else:
+            kinds[column] = "text"
+    return kinds
+
+
+def ingest(source=dataset.DATA_PATH, path=DB_PATH, chunksize=INGEST_CHUNK):
+    # Build the database from the CSV file(s) chunk by chunk, then index it.
+    # It is written next to `path` and moved into place when complete.
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    files = _source_files(source)
+    kinds = None
+    rows = 0
+    with sqlite3.connect(tmp_path) as conn:
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        for file in files:
+            for chunk in pd.read_csv(file["path"], chunksize=chunksize):
+                frame = dataset.preprocess(chunk, compact_columns=False)
+                kinds = kinds or _column_kinds(frame)
+                _to_sql_frame(frame).to_sql(TABLE, conn, if_exists="append", index=False)
+                rows += len(frame)
+        for i, columns in enumerate(INDEXES):
+            conn.execute(f"CREATE INDEX ix_{i} ON {TABLE} ({', '.join(map(quote_name, columns))})")
+        conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+        meta = {"format": STORE_FORMAT, "files": files, "kinds": kinds, "rows": rows}
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", [(key, json.dumps(value)) for key, value in meta.items()])
+        conn.execute("ANALYZE")
+    os.replace(tmp_path, path)
+    return meta
+
+
+def read_meta(path=DB_PATH):
+    try:
+        with sqlite3.connect(f"file:{quote(os.path.abspath(path))}?mode=ro", uri=True) as conn:
+            return {key: json.loads(value) for key, value in conn.execute("SELECT key, value FROM meta")}
+    except sqlite3.Error:
+        return None
+
+
+def is_current(source=dataset.DATA_PATH, path=DB_PATH):
+    meta = read_meta(path)
+    return meta is not None and meta.get("format") == STORE_FORMAT and meta["files"] == _source_files(source)
+
+
+class ConnectionPool:
+    # Read-only connections shared by a process's threads. Connections are
+    # opened on demand up to `size`; further callers wait for one to be
+    # returned. A forked child starts with an empty pool of its own.
+
+    def __init__(self, path, size=POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+
+    def _open(self):
+        conn = sqlite3.connect(f"file:{quote(os.path.abspath(self.path))}?mode=ro", uri=True,
+                               check_same_thread=False)
+        conn.execute("PRAGMA query_only=ON")
+        conn.execute(f"PRAGMA mmap_size={MMAP_BYTES}")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = None
+                if self._opened < self.size:
+                    conn = self._open()
+                    self._opened += 1
+        if conn is None:
+            conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+
+class SQLiteStore:
+    # The pages' aggregations expressed as SQL against the ingested table
+
+    def __init__(self, path=DB_PATH, pool_size=POOL_SIZE):
+        self.path = path
+        self.pool = ConnectionPool(path, pool_size)
+        self.kinds = read_meta(path)["kinds"]
+
+    def query(self, sql, params=()):
+        with self.pool.connection() as conn:
+            return pd.read_sql_query(sql, conn, params=params)
+
+    def rows(self, sql, params=()):
+        with self.pool.connection() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def group_counts(self, columns, where=None):
+        # Admissions per group like groupby(columns, observed=True).size()
+        names = ", ".join(map(quote_name, columns))
+        conditions = [f"{quote_name(column)} IS NOT NULL" for column in columns] + ([where] if where else [])
+        frame = self.query(
+            f"SELECT {names}, COUNT(*) AS n FROM {TABLE} WHERE {' AND '.join(conditions)} "
+            f"GROUP BY {names} ORDER BY {names}")
+        if len(columns) == 1:
+            index = pd.Index(frame[columns[0]].astype(object), name=columns[0])
+        else:
+            index = pd.MultiIndex.from_arrays([frame[column].astype(object) for column in columns], names=list(columns))
+        return pd.Series(frame['n'].to_numpy(dtype=np.int64), index=index)
+
+    def totals(self, columns):
+        # COUNT(*) and the count, sum, min and max of each column
+        parts = ["COUNT(*)"]
+        for column in columns:
+            name = quote_name(column)
+            parts += [f"COUNT({name})", f"TOTAL({name})", f"MIN({name})", f"MAX({name})"]
+        values = self.rows(f"SELECT {', '.join(parts)} FROM {TABLE}")[0]
+        result = {"rows": values[0]}
+        for i, column in enumerate(columns):
+            count, total, low, high = values[1 + 4 * i: 5 + 4 * i]
+            result[column] = {
+                "count": count, "sum": total,
+                "min": float('nan') if low is None else float(low),
+                "max": float('nan') if high is None else float(high),
+            }
+        return result
+
+    def grouped_sums(self, keys, aggregates, where=None, not_null=None, table=TABLE):
+        # One row per group of `keys` with the given SQL aggregate expressions;
+        # rows missing any of the `not_null` keys (by default all) are left out.
+        # `table` may be a parenthesised subquery over the admissions table.
+        names = ", ".join(map(quote_name, keys))
+        selects = ", ".join(f"{expression} AS {quote_name(label)}" for label, expression in aggregates.items())
+        conditions = [f"{quote_name(key)} IS NOT NULL" for key in (keys if not_null is None else not_null)]
+        conditions += [where] if where else []
+        frame = self.query(
+            f"SELECT {names}, {selects} FROM {table}{' WHERE ' + ' AND '.join(conditions) if conditions else ''} "
+            f"GROUP BY {names} ORDER BY {names}")
+        for key in keys:
+            frame[key] = frame[key].astype(object)
+        return frame.set_index(list(keys))
+
+    def year_totals(self):
+        # Years with their admissions, billed admissions and billing sums
+        return self.query(
+            f"SELECT {quote_name(YEAR_COLUMN)} AS year, COUNT(*) AS counts, "
+            f"COUNT({quote_name('Billing Amount')}) AS billing_counts, "
+            f"TOTAL({quote_name('Billing Amount')}) AS billing_sums "
+            f"FROM {TABLE} WHERE {quote_name(YEAR_COLUMN)} IS NOT NULL GROUP BY 1 ORDER BY 1")
+
+
+class StoreTimeline:
+    # healthcare.timeline.Timeline answered from the store: a date window is a
+    # range scan of the date index, and wide windows are binned from per-day
+    # totals instead of per-admission rows
+
+    def __init__(self, store, where=None):
+        self.store = store
+        self.where = where
+        condition = quote_name('Medical Condition')
+        self.conditions = [value for (value,) in store.rows(
+            f"SELECT DISTINCT {condition} FROM {TABLE} WHERE {condition} IS NOT NULL"
+            f"{' AND ' + where if where else ''} ORDER BY 1")]
+        self._rows = self.count()
+
+    def __len__(self):
+        return self._rows
+
+    def _filter(self, start, end):
+        date = quote_name('Date of Admission')
+        conditions = [f"{date} IS NOT NULL"] + ([self.where] if self.where else [])
+        params = []
+        if start is not None:
+            conditions.append(f"{date} >= ?")
+            params.append(pd.Timestamp(start).strftime(SQL_DATE_FORMAT))
+        if end is not None:
+            conditions.append(f"{date} <= ?")
+            params.append(pd.Timestamp(end).strftime(SQL_DATE_FORMAT))
+        return " AND ".join(conditions), params
+
+    def count(self, start=None, end=None):
+        where, params = self._filter(start, end)
+        return self.store.rows(f"SELECT COUNT(*) FROM {TABLE} WHERE {where}", params)[0][0]
+
+    def window(self, start=None, end=None):
+        where, params = self._filter(start, end)
+        rows = self.store.query(
+            f"SELECT {', '.join(map(quote_name, TIMELINE_COLUMNS))} FROM {TABLE} WHERE {where} "
+            f"ORDER BY {quote_name('Date of Admission')}, rowid", params)
+        rows['Date of Admission'] = pd.to_datetime(rows['Date of Admission'], format=SQL_DATE_FORMAT)
+        return rows
+
+    def binned(self, start=None, end=None, bins=400):
+        # Same cells as Timeline.binned, summed from (day, condition) totals
+        where, params = self._filter(start, end)
+        date, condition = quote_name('Date of Admission'), quote_name('Medical Condition')
+        days = self.store.query(
+            f"SELECT {date} AS day, {condition} AS condition, COUNT(*) AS admissions, "
+            f"TOTAL({quote_name('Billing Amount')}) AS billing FROM {TABLE} WHERE {where} AND {condition} IS NOT NULL "
+            f"GROUP BY 1, 2", params)
+        if days.empty:
+            return pd.DataFrame(columns=['Medical Condition', 'Date', 'Admissions', 'Billing Amount'])
+
+        nanos = pd.to_datetime(days['day'], format=SQL_DATE_FORMAT).to_numpy().astype(np.int64)
+        # The window's first and last admissions may have no condition
+        bounds = self.store.rows(f"SELECT MIN({date}), MAX({date}) FROM {TABLE} WHERE {where}", params)[0]
+        first, last = (pd.Timestamp(bound).value for bound in bounds)
+        width = max((last - first) // bins + 1, DAY)
+        days['Bin'] = (nanos - first) // width
+
+        cells = days.groupby(['condition', 'Bin'])[['admissions', 'billing']].sum().reset_index()
+        cells.columns = ['Medical Condition', 'Bin', 'Admissions', 'Billing Amount']
+        cells['Date'] = pd.to_datetime(first + cells['Bin'] * width + width // 2)
+        return cells[['Medical Condition', 'Date', 'Admissions', 'Billing Amount']]
+
+
+class StorePatientTable:
+    # healthcare.table.PatientTable answered from the store: the filter
+    # becomes a WHERE clause, the sort an ORDER BY and the page a LIMIT/OFFSET
+
+    def __init__(self, store, columns):
+        self.store = store
+        self.columns = columns
+
+    def __len__(self):
+        return self.store.rows(f"SELECT COUNT(*) FROM {TABLE}")[0][0]
+
+    def _condition(self, column, operator, value):
+        # SQL condition and parameters for one filter part, matching
+        # healthcare.table.match_filter; None when it is not supported
+        name = quote_name(column)
+        kind = self.store.kinds[column]
+        ignore_case = operator.startswith('i')
+        if ignore_case:
+            operator = operator[1:]
+        if kind == "number" and isinstance(value, str):
+            if operator in ('eq', 'ne', 'lt', 'le', 'gt', 'ge'):
+                # Comparing a numeric column with free text matches nothing
+                return ("1" if operator == 'ne' else "0"), []
+        elif kind != "number" and isinstance(value, float):
+            value = f"{value:g}"
+        if ignore_case and kind == "text":
+            # Case-insensitive: compare text lowercased on both sides
+            name = f"lower({name})"
+            value = value.lower()
+
+        if operator in ('eq', 'ne', 'lt', 'le', 'gt', 'ge'):
+            if kind == "date":
+                try:
+                    value = pd.Timestamp(value).strftime(SQL_DATE_FORMAT)
+                except ValueError:
+                    return None
+            symbol = {'eq': '=', 'ne': '!=', 'lt': '<', 'le': '<=', 'gt': '>', 'ge': '>='}[operator]
+            if operator == 'ne':
+                # Missing values never equal anything, so they pass "ne"
+                return f"({name} IS NULL OR {name} != ?)", [value]
+            return f"{name} {symbol} ?", [value]
+        if operator == 'contains':
+            return f"instr(CAST({name} AS TEXT), ?) > 0", [str(value)]
+        if operator == 'datestartswith':
+            return f"substr(CAST({name} AS TEXT), 1, length(?)) = ?", [str(value), str(value)]
+        return None
+
+    def page(self, page_current, page_size, sort_by=None, filter_query=None):
+        # Return (records, page_count) for the requested page
+        page_current = page_current or 0
+        conditions, params = [], []
+        for filter_part in (filter_query.split(' && ') if filter_query else []):
+            col_name, operator, filter_value = split_filter_part(filter_part)
+            if col_name not in self.columns:
+                continue
+            condition = self._condition(col_name, operator, filter_value)
+            if condition is not None:
+                conditions.append(condition[0])
+                params += condition[1]
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        order = "rowid"
+        if sort_by:
+            name = quote_name(sort_by[0]['column_id'])
+            direction = "ASC" if sort_by[0]['direction'] == 'asc' else "DESC"
+            # Missing values go last in either direction, ties keep file order
+            order = f"{name} IS NULL, {name} {direction}, rowid"
+
+        total = self.store.rows(f"SELECT COUNT(*) FROM {TABLE}{where}", params)[0][0]
+        records = self.store.query(
+            f"SELECT {', '.join(map(quote_name, self.columns))} FROM {TABLE}{where} ORDER BY {order} LIMIT ? OFFSET ?",
+            params + [page_size, page_current * page_size])
+        records = records.astype(object).where(records.notna(), None).to_dict('records')
+        return records, max(1, math.ceil(total / page_size))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store(source=dataset.DATA_PATH, path=DB_PATH):
+    # Open the process's store, first (re)building the database if the source
+    # changed since it was ingested
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if not is_current(source, path):
+                    with cache.write_lock(os.path.dirname(path) or "."):
+                        # Another process may have ingested it while this one waited
+                        if not is_current(source, path):
+                            ingest(source, path)
+                _store = SQLiteStore(path)
+    return _store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the SQLite database used by HEALTHCARE_BACKEND=sqlite.")
+    parser.add_argument("--source", default=dataset.DATA_PATH, help="CSV file, directory of CSV shards or glob to ingest")
+    parser.add_argument("--path", default=DB_PATH, help="database file to write")
+    parser.add_argument("--force", action="store_true", help="rebuild even if the database is current")
+    args = parser.parse_args(argv)
+
+    if not args.force and is_current(args.source, args.path):
+        print(f"{args.path} is up to date with {args.source}")
+        return
+
+    start = time.perf_counter()
+    with cache.write_lock(os.path.dirname(args.path) or "."):
+        meta = ingest(args.source, args.path)
+    print(f"Ingested {meta['rows']} rows from {args.source} into {args.path} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
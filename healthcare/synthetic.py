@@ -0,0 +1,125 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from healthcare import dataset
+
+# Columns sampled from their observed frequencies in the source
+FREQUENCY_COLUMNS = [
+    'Gender', 'Blood Type', 'Medical Condition', 'Insurance Provider', 'Admission Type',
+    'Medication', 'Test Results', 'Age', 'Length of Stay (Days)',
+]
+
+# Rows generated and written per step; bounds memory for the 10M-row sizes
+WRITE_CHUNK = 1_000_000
+
+
+class SyntheticAdmissions:
+    # Generates admissions with the schema and value distributions of a source
+    # export. Low-cardinality columns, age and length of stay follow their
+    # observed frequencies, billing follows the interpolated quantile function
+    # of the observed amounts and admission dates are uniform over the
+    # observed span.
+    # Doctors and hospitals are drawn from pools that grow with the row count
+    # at the source's distinct-per-row ratio, so a 10M-row set has the long
+    # tail of names the top-K charts are built for.
+
+    def __init__(self, source=dataset.DATA_PATH):
+        df = dataset.preprocess(
+            pd.concat([pd.read_csv(path) for path in dataset.source_paths(source)], ignore_index=True),
+            compact_columns=False)
+        self.columns = [column for column in pd.read_csv(dataset.source_paths(source)[0], nrows=0).columns]
+        self.frequencies = {
+            column: df[column].dropna().value_counts(normalize=True)
+            for column in FREQUENCY_COLUMNS
+        }
+        self.billing = np.sort(df['Billing Amount'].dropna().to_numpy())
+        self.first_date = df['Date of Admission'].min()
+        self.days = (df['Date of Admission'].max() - self.first_date).days + 1
+        self.room_range = (int(df['Room Number'].min()), int(df['Room Number'].max()))
+
+        names = df['Name'].str.split()
+        self.first_names = pd.unique(names.str[0].dropna())
+        self.last_names = pd.unique(names.str[-1].dropna())
+        self.doctors = df['Doctor'].dropna().unique()
+        self.hospitals = df['Hospital'].dropna().unique()
+        self.doctor_ratio = df['Doctor'].nunique() / len(df)
+        self.hospital_ratio = df['Hospital'].nunique() / len(df)
+
+    def _sample(self, rng, column, size):
+        frequencies = self.frequencies[column]
+        return rng.choice(frequencies.index.to_numpy(), size=size, p=frequencies.to_numpy())
+
+    def _people(self, rng, size):
+        first = rng.choice(self.first_names, size=size)
+        last = rng.choice(self.last_names, size=size)
+        return pd.Series(first).str.cat(pd.Series(last), sep=' ')
+
+    def _pool(self, rng, rows, ratio, names, make):
+        # The source's names, topped up with generated ones to about rows * ratio
+        extra = int(rows * ratio) - len(names)
+        if extra <= 0:
+            return np.asarray(names, dtype=object)
+        return np.concatenate([np.asarray(names, dtype=object), make(rng, extra).to_numpy(dtype=object)])
+
+    def _hospital_names(self, rng, size):
+        first = rng.choice(self.last_names, size=size)
+        second = rng.choice(self.last_names, size=size)
+        return pd.Series(first).str.cat(pd.Series(second), sep='-')
+
+    def chunks(self, rows, seed=0, chunk_rows=WRITE_CHUNK):
+        # Yield raw (unpreprocessed) frames with the source's columns totalling `rows` rows
+        rng = np.random.default_rng(seed)
+        doctors = self._pool(rng, rows, self.doctor_ratio, self.doctors, self._people)
+        hospitals = self._pool(rng, rows, self.hospital_ratio, self.hospitals, self._hospital_names)
+        for start in range(0, rows, chunk_rows):
+            size = min(chunk_rows, rows - start)
+            admitted = self.first_date + pd.to_timedelta(rng.integers(0, self.days, size), unit='D')
+            stay = pd.to_timedelta(self._sample(rng, 'Length of Stay (Days)', size), unit='D')
+            billing = np.interp(rng.random(size) * (len(self.billing) - 1), np.arange(len(self.billing)), self.billing)
+            frame = pd.DataFrame({
+                'Name': self._people(rng, size),
+                'Age': self._sample(rng, 'Age', size),
+                'Gender': self._sample(rng, 'Gender', size),
+                'Blood Type': self._sample(rng, 'Blood Type', size),
+                'Medical Condition': self._sample(rng, 'Medical Condition', size),
+                'Date of Admission': admitted.strftime(dataset.DATE_FORMAT),
+                'Doctor': rng.choice(doctors, size=size),
+                'Hospital': rng.choice(hospitals, size=size),
+                'Insurance Provider': self._sample(rng, 'Insurance Provider', size),
+                'Billing Amount': billing,
+                'Room Number': rng.integers(self.room_range[0], self.room_range[1] + 1, size),
+                'Admission Type': self._sample(rng, 'Admission Type', size),
+                'Discharge Date': (admitted + stay).strftime(dataset.DATE_FORMAT),
+                'Medication': self._sample(rng, 'Medication', size),
+                'Test Results': self._sample(rng, 'Test Results', size),
+            })
+            yield frame[self.columns]
+
+    def write(self, path, rows, seed=0):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        for i, chunk in enumerate(self.chunks(rows, seed)):
+            chunk.to_csv(tmp_path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+        os.replace(tmp_path, path)
+        return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic admissions CSV shaped like the source export.")
+    parser.add_argument("--source", default=dataset.DATA_PATH, help="CSV file, directory or glob to imitate")
+    parser.add_argument("--rows", type=int, required=True, help="number of admissions to generate")
+    parser.add_argument("--output", required=True, help="CSV file to write")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    SyntheticAdmissions(args.source).write(args.output, args.rows, args.seed)
+    print(f"Wrote {args.rows} rows to {args.output} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
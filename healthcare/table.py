@@ -0,0 +1,150 @@
+import math
+import re
+
+import numpy as np
+import pandas as pd
+
+# Operators understood by DataTable's custom filtering, keyed by every
+# spelling the filter string may use
+FILTER_OPERATORS = {
+    'ge': 'ge', '>=': 'ge',
+    'le': 'le', '<=': 'le',
+    'lt': 'lt', '<': 'lt',
+    'gt': 'gt', '>': 'gt',
+    'ne': 'ne', '!=': 'ne',
+    'eq': 'eq', '=': 'eq',
+    'contains': 'contains',
+    'datestartswith': 'datestartswith',
+}
+
+# DataTable prefixes operators with "s" (case-sensitive, its default) or "i"
+# (case-insensitive), e.g. "{Age} s>= 30" or "{Name} icontains le"
+CASE_PREFIXES = ('s', 'i')
+
+# "{column} operator value": the operator is the token right after the
+# column name, so operator words inside the value are never mistaken for it
+FILTER_PART = re.compile(r'^\{(.+?)\}\s+(\S+)\s*(.*)$')
+
+
+def split_filter_part(filter_part):
+    # Split "{Age} s>= 30" into ("Age", "ge", 30). Case-insensitive operators
+    # keep their "i" prefix ("{Name} icontains le" gives "icontains").
+    match = FILTER_PART.match(filter_part.strip())
+    if match is None:
+        return None, None, None
+    name, operator, value_part = match.groups()
+    prefix = ''
+    if operator not in FILTER_OPERATORS and operator[:1] in CASE_PREFIXES:
+        prefix, operator = operator[0], operator[1:]
+    if operator not in FILTER_OPERATORS:
+        return None, None, None
+
+    value_part = value_part.strip()
+    v0 = value_part[0] if value_part else ''
+    if v0 == value_part[-1:] and v0 in ("'", '"', '`') and len(value_part) > 1:
+        value = value_part[1:-1].replace('\\' + v0, v0)
+    else:
+        try:
+            value = float(value_part)
+        except ValueError:
+            value = value_part
+    operator = FILTER_OPERATORS[operator]
+    return name, 'i' + operator if prefix == 'i' else operator, value
+
+
+def match_filter(values, operator, filter_value):
+    # Boolean array for one "{column} operator value" filter part, or None
+    # when the operator is not supported
+    numeric = pd.api.types.is_numeric_dtype(values)
+    if isinstance(filter_value, float) and not numeric:
+        filter_value = f"{filter_value:g}"
+    if operator.startswith('i'):
+        # Case-insensitive: compare text lowercased on both sides
+        operator = operator[1:]
+        if not numeric and not pd.api.types.is_datetime64_any_dtype(values):
+            values = values.str.lower()
+            filter_value = filter_value.lower()
+
+    if operator in ('eq', 'ne', 'lt', 'le', 'gt', 'ge'):
+        if numeric and isinstance(filter_value, str):
+            # Comparing a numeric column with free text matches nothing
+            return np.full(len(values), operator == 'ne')
+        result = getattr(values, operator)(filter_value)
+    elif operator == 'contains':
+        text = values.astype(str) if numeric else values
+        result = text.str.contains(str(filter_value), regex=False)
+    elif operator == 'datestartswith':
+        result = values.astype(str).str.startswith(str(filter_value))
+    else:
+        return None
+    return result.fillna(False).to_numpy(dtype=bool)
+
+
+class PatientTable:
+    # Serves one page of a large frame at a time for a DataTable running with
+    # page_action/sort_action/filter_action set to 'custom'. Sort orders are
+    # computed once per column and direction and then reused, so a request
+    # costs a vectorised filter plus a page-sized slice.
+
+    def __init__(self, df, columns):
+        self.df = df[columns].reset_index(drop=True)
+        self.columns = columns
+        self._orders = {}
+
+    def __len__(self):
+        return len(self.df)
+
+    def sort_order(self, column, ascending=True):
+        key = (column, ascending)
+        if key not in self._orders:
+            # Dense ranks sort strings and numbers alike; missing values go last
+            ranks, uniques = pd.factorize(self.df[column], sort=True)
+            if not ascending:
+                ranks = np.where(ranks >= 0, len(uniques) - 1 - ranks, ranks)
+            ranks = np.where(ranks < 0, len(uniques), ranks)
+            self._orders[key] = np.argsort(ranks, kind='stable')
+        return self._orders[key]
+
+    def filter_mask(self, filter_query):
+        mask = np.ones(len(self.df), dtype=bool)
+        if not filter_query:
+            return mask
+
+        for filter_part in filter_query.split(' && '):
+            col_name, operator, filter_value = split_filter_part(filter_part)
+            if col_name not in self.df.columns:
+                continue
+            column = self.df[col_name]
+            if isinstance(column.dtype, pd.CategoricalDtype):
+                # Evaluate once per category and broadcast through the codes
+                matches = match_filter(column.cat.categories.to_series(), operator, filter_value)
+                if matches is None:
+                    continue
+                matches = np.append(matches, operator == 'ne')
+                mask &= matches[column.cat.codes.to_numpy()]
+            else:
+                matches = match_filter(column, operator, filter_value)
+                if matches is not None:
+                    mask &= matches
+        return mask
+
+    def page(self, page_current, page_size, sort_by=None, filter_query=None):
+        # Return (records, page_count) for the requested page
+        page_current = page_current or 0
+        if sort_by:
+            rows = self.sort_order(sort_by[0]['column_id'], sort_by[0]['direction'] == 'asc')
+        else:
+            rows = None
+
+        if filter_query:
+            mask = self.filter_mask(filter_query)
+            rows = np.flatnonzero(mask) if rows is None else rows[mask[rows]]
+            total = len(rows)
+        else:
+            total = len(self.df)
+
+        start = page_current * page_size
+        stop = start + page_size
+        visible = slice(start, stop) if rows is None else rows[start:stop]
+        records = self.df.iloc[visible].to_dict('records')
+        return records, max(1, math.ceil(total / page_size))
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+
+TIMELINE_COLUMNS = ['Date of Admission', 'Medical Condition', 'Billing Amount']
+DAY = np.timedelta64(1, 'D').astype('timedelta64[ns]').astype(np.int64)
+
+
+class Timeline:
+    # Admissions ordered by date, so the rows of any date window are found
+    # with two binary searches, plus date-bin x condition aggregation for
+    # windows too large to plot point by point.
+
+    def __init__(self, df):
+        order = np.argsort(df['Date of Admission'].to_numpy(), kind='stable')
+        self.frame = df[TIMELINE_COLUMNS].iloc[order].reset_index(drop=True)
+        self.dates = self.frame['Date of Admission'].to_numpy()
+        # Fixed condition order so every window colours conditions the same way
+        self.conditions = sorted(self.frame['Medical Condition'].dropna().unique())
+
+    def __len__(self):
+        return len(self.frame)
+
+    def _bounds(self, start, end):
+        lo = 0 if start is None else np.searchsorted(self.dates, np.datetime64(pd.Timestamp(start)), 'left')
+        hi = len(self.dates) if end is None else np.searchsorted(self.dates, np.datetime64(pd.Timestamp(end)), 'right')
+        return lo, max(lo, hi)
+
+    def count(self, start=None, end=None):
+        # Admissions in the window, without materialising them
+        lo, hi = self._bounds(start, end)
+        return hi - lo
+
+    def window(self, start=None, end=None):
+        lo, hi = self._bounds(start, end)
+        return self.frame.iloc[lo:hi]
+
+    def binned(self, start=None, end=None, bins=400):
+        # One row per (condition, date bin) with the admissions and total
+        # billing in that cell; bins are equal-width and at least one day wide
+        rows = self.window(start, end)
+        if rows.empty:
+            return pd.DataFrame(columns=['Medical Condition', 'Date', 'Admissions', 'Billing Amount'])
+
+        nanos = rows['Date of Admission'].to_numpy().astype('datetime64[ns]').astype(np.int64)
+        first = nanos[0]
+        width = max((nanos[-1] - first) // bins + 1, DAY)
+        offsets = (nanos - first) // width
+
+        cells = rows.groupby([rows['Medical Condition'], offsets], observed=True)['Billing Amount'].agg(['size', 'sum'])
+        cells = cells.reset_index()
+        cells.columns = ['Medical Condition', 'Bin', 'Admissions', 'Billing Amount']
+        cells['Date'] = pd.to_datetime(first + cells['Bin'] * width + width // 2)
+        return cells[['Medical Condition', 'Date', 'Admissions', 'Billing Amount']]
+
+
+def parse_relayout_range(relayout_data):
+    # (start, end) of the x axis from a Graph's relayoutData; (None, None)
+    # when the axis was reset to its full range. Returns False when the
+    # event did not touch the x axis (e.g. a legend click).
+    if not relayout_data:
+        return False
+    if relayout_data.get('xaxis.autorange'):
+        return None, None
+    if 'xaxis.range[0]' in relayout_data:
+        return relayout_data['xaxis.range[0]'], relayout_data.get('xaxis.range[1]')
+    if 'xaxis.range' in relayout_data:
+        return tuple(relayout_data['xaxis.range'])
+    return False
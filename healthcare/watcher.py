@@ -0,0 +1,105 @@
+import logging
+import os
+import threading
+
+from healthcare import aggregates, dataset
+from healthcare.store import SQLITE_BACKEND
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks of the data file; HEALTHCARE_WATCH_INTERVAL=0 disables watching
+WATCH_INTERVAL = float(os.environ.get("HEALTHCARE_WATCH_INTERVAL", 5))
+
+# Bytes just before the consumed offset that must be unchanged for growth to count as an append
+TAIL_CHECK_BYTES = 4096
+
+
+class DatasetWatcher(threading.Thread):
+    # Polls the data file and folds appended admissions into the shared frame.
+    # Only the new complete lines are parsed; anything other than an append
+    # (the file shrank or earlier bytes changed) triggers a full reload. The
+    # offset is the number of bytes the loaded data was parsed from, so rows
+    # appended while it loaded are picked up by the first check.
+
+    def __init__(self, path=dataset.DATA_PATH, interval=WATCH_INTERVAL):
+        super().__init__(name="dataset-watcher", daemon=True)
+        self.path = path
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._sync()
+
+    def _sync(self):
+        # Continue from wherever the dataset's rows end
+        self.offset = dataset.source_offset()
+        self.tail = self._read_tail()
+
+    def _read_tail(self):
+        with open(self.path, "rb") as f:
+            f.seek(max(0, self.offset - TAIL_CHECK_BYTES))
+            return f.read(min(self.offset, TAIL_CHECK_BYTES))
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.check()
+            except Exception:
+                logger.exception("Failed to refresh %s", self.path)
+
+    def check(self):
+        # Returns the number of appended rows, or None when nothing changed
+        size = os.path.getsize(self.path)
+        if size < self.offset or self._read_tail() != self.tail:
+            logger.info("%s was rewritten, reloading it", self.path)
+            self._reload()
+            return None
+        if dataset.cache_is_stale():
+            logger.info("The cache of %s was rebuilt, remapping it", self.path)
+            if not dataset.remap():
+                self._reload()
+                return None
+            self._sync()
+        if size == self.offset:
+            return None
+
+        # A partially written last line is left for the next check
+        new_rows, offset = dataset.read_appended(self.path, self.offset, size)
+        if new_rows is None:
+            return None
+        dataset.append_rows(new_rows, offset)
+        self._sync()
+        logger.info("Appended %d rows from %s", len(new_rows), self.path)
+        return len(new_rows)
+
+    def _reload(self):
+        dataset.reload_dataset(self.path)
+        self._sync()
+
+
+_watcher = None
+
+
+def prepare_watcher(path=dataset.DATA_PATH, interval=WATCH_INTERVAL):
+    # Create the process's watcher without starting it; the data is loaded
+    # first so the watcher starts from the bytes it was parsed from.
+    # Sharded sources (a directory or glob) are not watched. A watcher made
+    # before a fork is started in each child and catches up from that offset.
+    # The SQLite backend serves a snapshot and is not watched either.
+    global _watcher
+    if _watcher is None and interval > 0 and os.path.isfile(path) and not SQLITE_BACKEND:
+        if aggregates.CHUNKSIZE:
+            aggregates.get_aggregates()
+        else:
+            dataset.get_dataset()
+        _watcher = DatasetWatcher(path, interval)
+    return _watcher
+
+
+def start_watcher(path=dataset.DATA_PATH, interval=WATCH_INTERVAL):
+    # Start watching once per process
+    watcher = prepare_watcher(path, interval)
+    if watcher is not None and not watcher.is_alive():
+        watcher.start()
+    return watcher
@@ -0,0 +1,17 @@
+from dash import dcc
+
+from healthcare.aggregates import DEFAULT_TOP_K, TOP_K_CHOICES
+
+# Components shared by several pages. Dash does not register modules whose
+# names start with an underscore as pages.
+
+
+def top_k_dropdown(component_id):
+    # The top-K selector shown above every heavy-hitter chart
+    return dcc.Dropdown(
+        id=component_id,
+        options=[{'label': f"Top {k}", 'value': k} for k in TOP_K_CHOICES],
+        value=DEFAULT_TOP_K,
+        clearable=False,
+        style={"width": "150px", "color": "black"}
+    )
@@ -1,144 +1,221 @@
 import dash
 from dash import dcc, html, Input, Output
 import dash_bootstrap_components as dbc
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 
-# Load the dataset
-data = "./assets/data.csv"
-df_healthcare = pd.read_csv(data)
-
-# Preprocess the dataset
-df_healthcare['Date of Admission'] = pd.to_datetime(df_healthcare['Date of Admission'])
-df_healthcare['Discharge Date'] = pd.to_datetime(df_healthcare['Discharge Date'])
-df_healthcare['Length of Stay (Days)'] = (df_healthcare['Discharge Date'] - df_healthcare['Date of Admission']).dt.days
-df_healthcare['Name'] = df_healthcare['Name'].str.title()
-df_healthcare['Gender'] = df_healthcare['Gender'].str.capitalize()
-df_healthcare['Hospital'] = df_healthcare['Hospital'].str.strip()
-df_healthcare['Medical Condition'] = df_healthcare['Medical Condition'].str.capitalize()
-
-# Create age groups
-age_bins = [0, 18, 35, 50, 65, 100]
-age_labels = ["0-18", "19-35", "36-50", "51-65", "65+"]
-df_healthcare['Age Group'] = pd.cut(df_healthcare['Age'], bins=age_bins, labels=age_labels, right=False)
-
-# Graph 1: Blood Type vs Hospital (Bar Chart)
-blood_type_hospital = df_healthcare.groupby(['Blood Type', 'Hospital']).size().reset_index(name='Count')
-
-fig_blood_type_hospital = px.bar(
-    blood_type_hospital,
-    x='Hospital',
-    y='Count',
-    color='Blood Type',
-    barmode='stack',
-    title="Blood Type Distribution Across Hospitals"
-)
-fig_blood_type_hospital.update_layout(
-    plot_bgcolor="black",
-    paper_bgcolor="black",
-    font=dict(color="white"),
-    title=dict(x=0.5)
-)
+from healthcare.aggregates import DEFAULT_TOP_K, get_aggregates
+from healthcare.figure_cache import cached_callback, per_dataset_version
+from healthcare.payload import compact_graphs
+from pages._components import top_k_dropdown
 
-# Graph 2: Blood Type vs Age Group (Stacked Bar Chart)
-blood_type_age = df_healthcare.groupby(['Blood Type', 'Age Group']).size().reset_index(name='Count')
+# Most extreme outliers drawn per blood type in the length of stay box plot
+MAX_BOX_OUTLIERS = 50
 
-fig_blood_type_age = px.bar(
-    blood_type_age,
-    x='Age Group',
-    y='Count',
-    color='Blood Type',
-    barmode='stack',
-    title="Age Group Distribution by Blood Type"
-)
-fig_blood_type_age.update_layout(
-    plot_bgcolor="black",
-    paper_bgcolor="black",
-    font=dict(color="white"),
-    title=dict(x=0.5)
-)
 
-# Graph 3: Blood Type vs Doctor (Bar Chart)
-blood_type_doctor = df_healthcare.groupby(['Blood Type', 'Doctor']).size().reset_index(name='Count')
+# The busiest hospitals and doctors come from bounded heavy-hitter summaries;
+# everything else is folded into an "Other" bar
+@cached_callback
+def blood_type_hospital_figure(top_k):
+    blood_type_hospital = get_aggregates().top_counts('Hospital', 'Blood Type', top_k).reset_index()
 
-fig_blood_type_doctor = px.bar(
-    blood_type_doctor,
-    x='Doctor',
-    y='Count',
-    color='Blood Type',
-    barmode='group',
-    title="Blood Type Distribution by Doctor"
-)
-fig_blood_type_doctor.update_layout(
-    plot_bgcolor="black",
-    paper_bgcolor="black",
-    font=dict(color="white"),
-    title=dict(x=0.5)
-)
+    fig_blood_type_hospital = px.bar(
+        blood_type_hospital,
+        x='Hospital',
+        y='Count',
+        color='Blood Type',
+        barmode='stack',
+        title="Blood Type Distribution Across Hospitals"
+    )
+    fig_blood_type_hospital.update_layout(
+        plot_bgcolor="black",
+        paper_bgcolor="black",
+        font=dict(color="white"),
+        title=dict(x=0.5)
+    )
+    return fig_blood_type_hospital
 
-# Graph 4: Blood Type Distribution (Pie Chart)
-blood_type_distribution = df_healthcare['Blood Type'].value_counts().reset_index()
-blood_type_distribution.columns = ['Blood Type', 'Count']
 
-fig_blood_type_pie = px.pie(
-    blood_type_distribution,
-    names='Blood Type',
-    values='Count',
-    title="Proportion of Blood Types",
-    color_discrete_sequence=px.colors.sequential.Plasma
-)
-fig_blood_type_pie.update_layout(
-    plot_bgcolor="black",
-    paper_bgcolor="black",
-    font=dict(color="white"),
-    title=dict(x=0.5)
-)
+@cached_callback
+def blood_type_doctor_figure(top_k):
+    blood_type_doctor = get_aggregates().top_counts('Doctor', 'Blood Type', top_k).reset_index()
 
-# Graph 5: Length of Stay by Blood Type (Box Plot)
-fig_blood_type_los = px.box(
-    df_healthcare,
-    x='Blood Type',
-    y='Length of Stay (Days)',
-    color='Blood Type',
-    title="Length of Stay Distribution by Blood Type"
-)
-fig_blood_type_los.update_layout(
-    plot_bgcolor="black",
-    paper_bgcolor="black",
-    font=dict(color="white"),
-    title=dict(x=0.5)
+    fig_blood_type_doctor = px.bar(
+        blood_type_doctor,
+        x='Doctor',
+        y='Count',
+        color='Blood Type',
+        barmode='group',
+        title="Blood Type Distribution by Doctor"
+    )
+    fig_blood_type_doctor.update_layout(
+        plot_bgcolor="black",
+        paper_bgcolor="black",
+        font=dict(color="white"),
+        title=dict(x=0.5)
+    )
+    return fig_blood_type_doctor
+
+
+# Figures are built on the first visit to the page, then reused until the dataset changes
+@per_dataset_version
+def build_layout():
+    # Per-group counts and sketches maintained alongside the shared dataset
+    aggregates = get_aggregates()
+
+    # Graph 1: Blood Type vs Hospital (Bar Chart)
+    fig_blood_type_hospital = blood_type_hospital_figure(DEFAULT_TOP_K)
+
+    # Graph 2: Blood Type vs Age Group (Stacked Bar Chart)
+    blood_type_age = aggregates.counts('Blood Type', 'Age Group', complete=True).reset_index()
+
+    fig_blood_type_age = px.bar(
+        blood_type_age,
+        x='Age Group',
+        y='Count',
+        color='Blood Type',
+        barmode='stack',
+        title="Age Group Distribution by Blood Type"
+    )
+    fig_blood_type_age.update_layout(
+        plot_bgcolor="black",
+        paper_bgcolor="black",
+        font=dict(color="white"),
+        title=dict(x=0.5)
+    )
+
+    # Graph 3: Blood Type vs Doctor (Bar Chart)
+    fig_blood_type_doctor = blood_type_doctor_figure(DEFAULT_TOP_K)
+
+    # Graph 4: Blood Type Distribution (Pie Chart)
+    blood_type_distribution = aggregates.value_counts('Blood Type').reset_index()
+
+    fig_blood_type_pie = px.pie(
+        blood_type_distribution,
+        names='Blood Type',
+        values='Count',
+        title="Proportion of Blood Types",
+        color_discrete_sequence=px.colors.sequential.Plasma
+    )
+    fig_blood_type_pie.update_layout(
+        plot_bgcolor="black",
+        paper_bgcolor="black",
+        font=dict(color="white"),
+        title=dict(x=0.5)
+    )
+
+    # Graph 5: Length of Stay by Blood Type (Box Plot)
+    # Quartiles, fences and a bounded sample of outliers are computed on the server
+    # from mergeable per-blood-type sketches, so no per-admission values are sent
+    fig_blood_type_los = go.Figure()
+    colors = px.colors.qualitative.Plotly
+    for i, (blood_type, sketch) in enumerate(aggregates.length_of_stay_sketches().items()):
+        stats = sketch.box_stats(max_outliers=MAX_BOX_OUTLIERS)
+        color = colors[i % len(colors)]
+        fig_blood_type_los.add_trace(go.Box(
+            name=blood_type,
+            x=[blood_type],
+            q1=[stats['q1']],
+            median=[stats['median']],
+            q3=[stats['q3']],
+            lowerfence=[stats['lowerfence']],
+            upperfence=[stats['upperfence']],
+            marker_color=color,
+            legendgroup=blood_type,
+            offsetgroup=blood_type,
+            alignmentgroup='Blood Type'
+        ))
+        if len(stats['outliers']):
+            fig_blood_type_los.add_trace(go.Scatter(
+                x=[blood_type] * len(stats['outliers']),
+                y=stats['outliers'],
+                mode='markers',
+                marker_color=color,
+                legendgroup=blood_type,
+                offsetgroup=blood_type,
+                alignmentgroup='Blood Type',
+                showlegend=False,
+                name=blood_type
+            ))
+    fig_blood_type_los.update_layout(
+        title="Length of Stay Distribution by Blood Type",
+        xaxis_title='Blood Type',
+        yaxis_title='Length of Stay (Days)',
+        legend_title_text='Blood Type',
+        boxmode='group',
+        scattermode='group'
+    )
+    fig_blood_type_los.update_layout(
+        plot_bgcolor="black",
+        paper_bgcolor="black",
+        font=dict(color="white"),
+        title=dict(x=0.5)
+    )
+
+    # Define Layout
+    return compact_graphs(dbc.Container(
+        [
+            dbc.Row(
+                dbc.Col(html.H1("Blood Type Analysis", className="text-center", style={"color": "#1DB954"})),
+                className="mb-4"
+            ),
+            dbc.Row(
+                dbc.Col(
+                    [
+                        top_k_dropdown("blood-type-hospital-top-k"),
+                        dcc.Graph(id="blood-type-hospital-graph", figure=fig_blood_type_hospital)
+                    ],
+                    width=12
+                ),
+                className="mb-4"
+            ),
+            dbc.Row(
+                dbc.Col(dcc.Graph(figure=fig_blood_type_age), width=12),
+                className="mb-4"
+            ),
+            dbc.Row(
+                [
+                    dbc.Col(
+                        [
+                            top_k_dropdown("blood-type-doctor-top-k"),
+                            dcc.Graph(id="blood-type-doctor-graph", figure=fig_blood_type_doctor)
+                        ],
+                        width=6
+                    ),
+                    dbc.Col(dcc.Graph(figure=fig_blood_type_pie), width=6)
+                ],
+                className="mb-4"
+            ),
+            dbc.Row(
+                dbc.Col(dcc.Graph(figure=fig_blood_type_los), width=12),
+                className="mb-4"
+            )
+        ],
+        fluid=True
+    ))
+
+
+def layout(**kwargs):
+    return build_layout()
+
+
+@dash.callback(
+    Output("blood-type-hospital-graph", "figure"),
+    Input("blood-type-hospital-top-k", "value"),
+    prevent_initial_call=True
 )
+def update_blood_type_hospital(top_k):
+    return blood_type_hospital_figure(top_k)
+
 
-# Define Layout
-layout = dbc.Container(
-    [
-        dbc.Row(
-            dbc.Col(html.H1("Blood Type Analysis", className="text-center", style={"color": "#1DB954"})),
-            className="mb-4"
-        ),
-        dbc.Row(
-            dbc.Col(dcc.Graph(figure=fig_blood_type_hospital), width=12),
-            className="mb-4"
-        ),
-        dbc.Row(
-            dbc.Col(dcc.Graph(figure=fig_blood_type_age), width=12),
-            className="mb-4"
-        ),
-        dbc.Row(
-            [
-                dbc.Col(dcc.Graph(figure=fig_blood_type_doctor), width=6),
-                dbc.Col(dcc.Graph(figure=fig_blood_type_pie), width=6)
-            ],
-            className="mb-4"
-        ),
-        dbc.Row(
-            dbc.Col(dcc.Graph(figure=fig_blood_type_los), width=12),
-            className="mb-4"
-        )
-    ],
-    fluid=True
+@dash.callback(
+    Output("blood-type-doctor-graph", "figure"),
+    Input("blood-type-doctor-top-k", "value"),
+    prevent_initial_call=True
 )
+def update_blood_type_doctor(top_k):
+    return blood_type_doctor_figure(top_k)
+
 
 # Register the page
 dash.register_page(__name__, path="/blood-type-analysis")
@@ -1,138 +1,263 @@
+import os
+
 import dash
 import dash_bootstrap_components as dbc
-import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from dash import dcc, html
+from dash import dcc, html, Input, Output
 import numpy as np
 
-# Load the dataset
-data = "./assets/data.csv"
-df_healthcare = pd.read_csv(data)
-
-# Preprocess the dataset
-df_healthcare['Date of Admission'] = pd.to_datetime(df_healthcare['Date of Admission'])
-df_healthcare['Discharge Date'] = pd.to_datetime(df_healthcare['Discharge Date'])
-df_healthcare['Length of Stay (Days)'] = (df_healthcare['Discharge Date'] - df_healthcare['Date of Admission']).dt.days
-df_healthcare['Name'] = df_healthcare['Name'].str.title()
-df_healthcare['Gender'] = df_healthcare['Gender'].str.capitalize()
-df_healthcare['Hospital'] = df_healthcare['Hospital'].str.strip()
-df_healthcare['Medical Condition'] = df_healthcare['Medical Condition'].str.capitalize()
-
-# Graph 1: Treemap of Medical Conditions by Hospital
-fig_treemap_conditions = px.treemap(
-    df_healthcare,
-    path=['Hospital', 'Medical Condition'],
-    values='Billing Amount',
-    title="Treemap of Medical Conditions by Hospital",
-    color='Length of Stay (Days)',
-    color_continuous_scale='Viridis'
-)
-fig_treemap_conditions.update_layout(
-    paper_bgcolor="black",
-    font=dict(color="white"),
-    title_font=dict(size=16),
-    margin=dict(t=50, l=10, r=10, b=10)
-)
+from healthcare.aggregates import get_aggregates
+from healthcare.dataset import get_columns
+from healthcare.figure_cache import cached_callback, per_dataset_version
+from healthcare.payload import compact_graphs
+from healthcare.store import SQLITE_BACKEND, StoreTimeline, get_store
+from healthcare.timeline import TIMELINE_COLUMNS, Timeline, parse_relayout_range
 
-# Graph 2: Bubble Chart of Billing Amount vs Length of Stay by Medical Condition
-condition_bubble_data = df_healthcare.groupby('Medical Condition').agg(
-    {'Billing Amount': 'sum', 'Length of Stay (Days)': 'mean', 'Name': 'count'}).reset_index()
-condition_bubble_data.rename(columns={'Name': 'Number of Patients'}, inplace=True)
-
-fig_bubble_conditions = px.scatter(
-    condition_bubble_data,
-    x='Length of Stay (Days)',
-    y='Billing Amount',
-    size='Number of Patients',
-    color='Medical Condition',
-    title="Billing Amount vs Length of Stay by Medical Condition",
-    size_max=50,
-    hover_data={'Medical Condition': True, 'Number of Patients': True, 'Billing Amount': ':.2f'}
-)
-fig_bubble_conditions.update_layout(
-    plot_bgcolor="black",
-    paper_bgcolor="black",
-    font=dict(color="white"),
-    title_font=dict(size=16),
-    margin=dict(t=50, l=10, r=10, b=10)
-)
+# Above this many admissions in view the timeline is drawn as date-bin x condition
+# cells carrying counts and total billing; zooming in far enough brings back points
+TIMELINE_MAX_POINTS = int(os.environ.get("HEALTHCARE_TIMELINE_MAX_POINTS", 20000))
+TIMELINE_BINS = 400
 
-# Replace negative billing amounts with NaN or filter them out
-df_healthcare = df_healthcare[df_healthcare['Billing Amount'] >= 0]
-
-# Graph 3: Timeline of Admissions by Medical Condition
-fig_timeline_conditions = px.scatter(
-    df_healthcare,
-    x='Date of Admission',
-    y='Medical Condition',
-    color='Medical Condition',
-    size='Billing Amount',  # Marker size
-    title="Timeline of Admissions by Medical Condition",
-    hover_data={'Date of Admission': True, 'Medical Condition': True, 'Billing Amount': ':.2f'}
-)
 
-fig_timeline_conditions.update_layout(
-    plot_bgcolor="black",
-    paper_bgcolor="black",
-    font=dict(color="white"),
-    title_font=dict(size=16),
-    margin=dict(t=50, l=10, r=10, b=10)
-)
+@per_dataset_version
+def get_timeline():
+    # Replace negative billing amounts with NaN or filter them out
+    if SQLITE_BACKEND:
+        return StoreTimeline(get_store(), where='"Billing Amount" >= 0')
+    df_healthcare = get_columns(TIMELINE_COLUMNS)
+    return Timeline(df_healthcare[df_healthcare['Billing Amount'] >= 0])
 
 
-# Graph 4: Correlation Heatmap
+def timeline_figure(timeline, start=None, end=None):
+    if timeline.count(start, end) <= TIMELINE_MAX_POINTS:
+        fig = px.scatter(
+            timeline.window(start, end),
+            x='Date of Admission',
+            y='Medical Condition',
+            color='Medical Condition',
+            size='Billing Amount',  # Marker size
+            title="Timeline of Admissions by Medical Condition",
+            hover_data={'Date of Admission': True, 'Medical Condition': True, 'Billing Amount': ':.2f'},
+            category_orders={'Medical Condition': timeline.conditions},
+            render_mode='webgl'
+        )
+    else:
+        cells = timeline.binned(start, end, TIMELINE_BINS)
+        sizeref = cells['Billing Amount'].max() / (20 ** 2)
+        colors = px.colors.qualitative.Plotly
+        fig = go.Figure()
+        for condition, condition_cells in cells.groupby('Medical Condition', observed=True):
+            i = timeline.conditions.index(condition)
+            fig.add_trace(go.Scattergl(
+                x=condition_cells['Date'],
+                y=[condition] * len(condition_cells),
+                mode='markers',
+                name=condition,
+                marker=dict(size=condition_cells['Billing Amount'], sizemode='area', sizeref=sizeref,
+                            color=colors[i % len(colors)]),
+                customdata=condition_cells[['Admissions', 'Billing Amount']],
+                hovertemplate="%{x|%Y-%m-%d}<br>" + str(condition)
+                              + "<br>Admissions=%{customdata[0]}<br>Billing Amount=%{customdata[1]:.2f}<extra></extra>"
+            ))
+        fig.update_layout(
+            title="Timeline of Admissions by Medical Condition",
+            xaxis_title='Date of Admission',
+            yaxis_title='Medical Condition',
+            legend_title_text='Medical Condition'
+        )
 
-df_healthcare['Medical Condition'] = pd.factorize(df_healthcare['Medical Condition'])[0]
+    fig.update_layout(
+        plot_bgcolor="black",
+        paper_bgcolor="black",
+        font=dict(color="white"),
+        title_font=dict(size=16),
+        margin=dict(t=50, l=10, r=10, b=10)
+    )
+    if start is not None and end is not None:
+        fig.update_xaxes(range=[start, end])
+    return fig
 
 
-correlation_data = df_healthcare[['Age', 'Billing Amount', 'Length of Stay (Days)', 'Medical Condition']].corr()
+def condition_figures(first_month=None, last_month=None):
+    # Treemap, bubble chart and correlation heatmap for an inclusive range of
+    # admission months (all admissions when no range is given), assembled
+    # from the monthly partitions rather than from the admissions themselves
+    monthly = get_aggregates().monthly
 
-fig_correlation_heatmap = go.Figure(
-    data=go.Heatmap(
-        z=correlation_data.values,
-        x=correlation_data.columns,
-        y=correlation_data.columns,
-        colorscale='Viridis',
-        colorbar=dict(title="Correlation")
-    )
-)
-fig_correlation_heatmap.update_layout(
-    title="Correlation Heatmap of Numerical Variables",
-    xaxis=dict(tickangle=45),
-    plot_bgcolor="black",
-    paper_bgcolor="black",
-    font=dict(color="white"),
-    title_font=dict(size=16),
-    margin=dict(t=50, l=10, r=10, b=10)
-)
+    # Hospital x condition sums behind both the treemap and the bubble chart
+    condition_summary = monthly.condition_summary(first_month, last_month)
 
-# Define Layout
-layout = dbc.Container(
-    [
-        dbc.Row(
-            dbc.Col(html.H1("Medical Condition Analysis", className="text-center", style={"color": "#0d6efd",})),
-            className="mb-4"
-        ),
-        dbc.Row(
-            dbc.Col(dcc.Graph(figure=fig_treemap_conditions), width=12),
-            className="mb-4"
+    # Graph 1: Treemap of Medical Conditions by Hospital
+    treemap_nodes = condition_summary.treemap_nodes()
+    fig_treemap_conditions = go.Figure(go.Treemap(
+        ids=treemap_nodes['ids'],
+        labels=treemap_nodes['labels'],
+        parents=treemap_nodes['parents'],
+        values=treemap_nodes['values'],
+        branchvalues='total',
+        marker=dict(
+            colors=treemap_nodes['colors'],
+            colorscale='Viridis',
+            colorbar=dict(title='Length of Stay (Days)')
         ),
-        dbc.Row(
-            dbc.Col(dcc.Graph(figure=fig_bubble_conditions), width=12),
-            className="mb-4"
-        ),
-        dbc.Row(
-            dbc.Col(dcc.Graph(figure=fig_timeline_conditions), width=12),
-            className="mb-4"
-        ),
-        dbc.Row(
-            dbc.Col(dcc.Graph(figure=fig_correlation_heatmap), width=12),
-            className="mb-4"
+        hovertemplate="%{label}<br>Billing Amount=%{value:.2f}<br>Length of Stay (Days)=%{color:.1f}<extra></extra>"
+    ))
+    fig_treemap_conditions.update_layout(
+        title="Treemap of Medical Conditions by Hospital",
+        paper_bgcolor="black",
+        font=dict(color="white"),
+        title_font=dict(size=16),
+        margin=dict(t=50, l=10, r=10, b=10)
+    )
+
+    # Graph 2: Bubble Chart of Billing Amount vs Length of Stay by Medical Condition
+    condition_bubble_data = condition_summary.bubble_data()
+
+    fig_bubble_conditions = px.scatter(
+        condition_bubble_data,
+        x='Length of Stay (Days)',
+        y='Billing Amount',
+        size='Number of Patients',
+        color='Medical Condition',
+        title="Billing Amount vs Length of Stay by Medical Condition",
+        size_max=50,
+        hover_data={'Medical Condition': True, 'Number of Patients': True, 'Billing Amount': ':.2f'}
+    )
+    fig_bubble_conditions.update_layout(
+        plot_bgcolor="black",
+        paper_bgcolor="black",
+        font=dict(color="white"),
+        title_font=dict(size=16),
+        margin=dict(t=50, l=10, r=10, b=10)
+    )
+
+    # Graph 4: Correlation Heatmap, over admissions with a non-negative billing
+    # amount and with conditions encoded as integers
+    correlation_data = monthly.correlation(first_month, last_month)
+
+    fig_correlation_heatmap = go.Figure(
+        data=go.Heatmap(
+            z=correlation_data.values,
+            x=correlation_data.columns,
+            y=correlation_data.columns,
+            colorscale='Viridis',
+            colorbar=dict(title="Correlation")
+        )
+    )
+    fig_correlation_heatmap.update_layout(
+        title="Correlation Heatmap of Numerical Variables",
+        xaxis=dict(tickangle=45),
+        plot_bgcolor="black",
+        paper_bgcolor="black",
+        font=dict(color="white"),
+        title_font=dict(size=16),
+        margin=dict(t=50, l=10, r=10, b=10)
+    )
+    return fig_treemap_conditions, fig_bubble_conditions, fig_correlation_heatmap
+
+
+def month_range_slider(months):
+    # Admission-month range selector, marked at each January
+    first_month, last_month = (int(months[0]), int(months[-1])) if len(months) else (0, 0)
+    return html.Div([
+        html.Label("Select Admission Months for the Treemap, Bubble Chart and Heatmap:",
+                   style={"color": "#0d6efd", "font-size": "16px"}),
+        dcc.RangeSlider(
+            id="condition-month-range",
+            min=first_month,
+            max=last_month,
+            value=[first_month, last_month],
+            marks={month: str(month // 12) for month in range(first_month, last_month + 1) if month % 12 == 0},
+            step=1,
+            # Month numbers are shown as "Jan 2024" by assets/conditions.js
+            tooltip={"placement": "bottom", "always_visible": True, "transform": "monthLabel"}
         )
-    ],
-    fluid=True
+    ])
+
+
+# Figures are built on the first visit to the page, then reused until the dataset changes
+@per_dataset_version
+def build_layout():
+    fig_treemap_conditions, fig_bubble_conditions, fig_correlation_heatmap = condition_figures()
+
+    # Graph 3: Timeline of Admissions by Medical Condition
+    fig_timeline_conditions = timeline_figure(get_timeline())
+
+    # Define Layout
+    return compact_graphs(dbc.Container(
+        [
+            dbc.Row(
+                dbc.Col(html.H1("Medical Condition Analysis", className="text-center", style={"color": "#0d6efd",})),
+                className="mb-4"
+            ),
+            dbc.Row(
+                dbc.Col(month_range_slider(get_aggregates().monthly.months), width=12),
+                className="mb-4"
+            ),
+            dbc.Row(
+                dbc.Col(dcc.Graph(id="condition-treemap-graph", figure=fig_treemap_conditions), width=12),
+                className="mb-4"
+            ),
+            dbc.Row(
+                dbc.Col(dcc.Graph(id="condition-bubble-graph", figure=fig_bubble_conditions), width=12),
+                className="mb-4"
+            ),
+            dbc.Row(
+                dbc.Col(dcc.Graph(id="timeline-conditions-graph", figure=fig_timeline_conditions), width=12),
+                className="mb-4"
+            ),
+            dbc.Row(
+                dbc.Col(dcc.Graph(id="condition-correlation-graph", figure=fig_correlation_heatmap), width=12),
+                className="mb-4"
+            )
+        ],
+        fluid=True
+    ))
+
+
+def layout(**kwargs):
+    return build_layout()
+
+
+# Callback for the timeline: re-bin (or switch to points) for the zoomed date range
+@dash.callback(
+    Output("timeline-conditions-graph", "figure"),
+    Input("timeline-conditions-graph", "relayoutData"),
+    prevent_initial_call=True
 )
+def update_timeline(relayout_data):
+    window = parse_relayout_range(relayout_data)
+    if window is False:
+        return dash.no_update
+    return timeline_for_window(*window)
+
+
+@cached_callback
+def timeline_for_window(start, end):
+    return timeline_figure(get_timeline(), start, end)
+
+
+# Callback for the month range: redraw the treemap, bubble chart and heatmap
+@dash.callback(
+    Output("condition-treemap-graph", "figure"),
+    Output("condition-bubble-graph", "figure"),
+    Output("condition-correlation-graph", "figure"),
+    Input("condition-month-range", "value"),
+    prevent_initial_call=True
+)
+def update_condition_range(month_range):
+    months = get_aggregates().monthly.months
+    if not len(months) or list(month_range) == [months[0], months[-1]]:
+        # The full range also covers admissions without a date, like the initial figures
+        return condition_figures_for_range(None, None)
+    return condition_figures_for_range(*month_range)
+
+
+@cached_callback
+def condition_figures_for_range(first_month, last_month):
+    return condition_figures(first_month, last_month)
+
 
 # Register the page
 dash.register_page(__name__, path="/medical_condition_analysis")
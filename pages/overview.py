@@ -1,10 +1,17 @@
+import os
+
 import dash
-from dash import dcc, html, Input, Output
+from dash import dcc, html, ClientsideFunction, Input, Output
 import dash_bootstrap_components as dbc
 from dash.dash_table import DataTable
-import pandas as pd
 import plotly.graph_objects as go
 
+from healthcare.aggregates import get_aggregates
+from healthcare.dataset import get_columns
+from healthcare.figure_cache import cached_callback, per_dataset_version
+from healthcare.store import SQLITE_BACKEND, StorePatientTable, get_store
+from healthcare.table import PatientTable
+
 # Load and preprocess the updated dataset
 # data = [
 #     ["Bobby Jackson", 30, "Male", "B-", "Cancer", "2024-01-31", "Matthew Smith", "Sons and Miller", "Blue Cross", 18856.28, 328, "Urgent", "2024-02-02", "Paracetamol", "Normal"],
@@ -22,151 +29,161 @@ import plotly.graph_objects as go
 #            "Insurance Provider", "Billing Amount", "Room Number", "Admission Type", "Discharge Date", "Medication", 
 #            "Test Results"]
 
-# Specify the file path
-data = "./assets/data.csv"
+# Patient Details table is paged, sorted and filtered on the server
+table_columns = ["Name", "Age", "Gender", "Medical Condition", "Billing Amount"]
+numeric_columns = {"Age", "Billing Amount"}
+TABLE_PAGE_SIZE = 20
 
-# Load the CSV file into a DataFrame
-df_healthcare = pd.read_csv(data)
+# The year-range charts are redrawn in the browser from per-year totals shipped
+# once in a dcc.Store (assets/overview.js). HEALTHCARE_CLIENTSIDE_FILTERING=0 is
+# the fallback: it registers the server-side update_graphs callback instead, for
+# deployments where overview.js is not served (e.g. assets on a CDN without it)
+# or to rule the browser code out when the charts look wrong. Both draw the same
+# charts; tests/test_overview.py runs overview.js under Node against update_graphs.
+CLIENTSIDE_FILTERING = os.environ.get("HEALTHCARE_CLIENTSIDE_FILTERING", "1") != "0"
 
-# Preprocess data
-df_healthcare['Date of Admission'] = pd.to_datetime(df_healthcare['Date of Admission'])
-df_healthcare['Discharge Date'] = pd.to_datetime(df_healthcare['Discharge Date'])
-df_healthcare['Length of Stay (Days)'] = (df_healthcare['Discharge Date'] - df_healthcare['Date of Admission']).dt.days
-df_healthcare['Name'] = df_healthcare['Name'].str.title()
-df_healthcare['Gender'] = df_healthcare['Gender'].str.capitalize()
-df_healthcare['Hospital'] = df_healthcare['Hospital'].str.strip()
-df_healthcare['Medical Condition'] = df_healthcare['Medical Condition'].str.capitalize()
 
-# Metrics
-avg_length_of_stay = df_healthcare['Length of Stay (Days)'].mean()
-most_common_condition = df_healthcare['Medical Condition'].mode()[0]
+@per_dataset_version
+def get_patient_table():
+    if SQLITE_BACKEND:
+        return StorePatientTable(get_store(), table_columns)
+    return PatientTable(get_columns(table_columns), table_columns)
+
 
 # Define layout for the Overview page
 dash.register_page(__name__, path="/")
 
-layout = dbc.Container(
-    [
-        dbc.Row(
-            [
-                dbc.Col(html.Div([
-                    html.H1("Health Care Overview", className="text-center", style={"color": "#0d6efd", "margin-bottom": "20px"})
-                ]), width=12)
-            ],
-            className="mb-4",
-            style={"backgroundColor": "black"},
-        ),
-
-        # Metric Overview
-        dbc.Row(
-            [
-                dbc.Col(html.Div([
-                    html.H2(f"{len(df_healthcare)}", className="text-center", style={"color": "#0d6efd"}),
-                    html.P("Total Admissions", className="text-center", style={"color": "white"})
-                ]), width=3, className="p-3", style={"backgroundColor": "#000"}),
-
-                dbc.Col(html.Div([
-                    html.H2(f"{round(avg_length_of_stay, 1)} Days", className="text-center", style={"color": "#0d6efd"}),
-                    html.P("Avg Length of Stay", className="text-center", style={"color": "white"})
-                ]), width=3, className="p-3", style={"backgroundColor": "#000"}),
-
-                dbc.Col(html.Div([
-                    html.H2(f"{most_common_condition}", className="text-center", style={"color": "#0d6efd"}),
-                    html.P("Most Common Condition", className="text-center", style={"color": "white"})
-                ]), width=3, className="p-3", style={"backgroundColor": "#000"}),
-
-                dbc.Col(html.Div([
-                    html.H2(f"${round(df_healthcare['Billing Amount'].mean(), 2)}", className="text-center", style={"color": "#0d6efd"}),
-                    html.P("Avg Billing Amount (USD)", className="text-center", style={"color": "white"})
-                ]), width=3, className="p-3", style={"backgroundColor": "#000"}),
-            ],
-            justify="center",
-            className="mb-4"
-        ),
-
-        # Year Range Slider
-        dbc.Row(
-            [
-                dbc.Col(
-                    html.Div([
-                        html.Label("Select Year Range for Analysis:", style={"color": "#0d6efd", "font-size": "16px"}),
-                        dcc.RangeSlider(
-                            id="year-range-slider",
-                            min=df_healthcare['Date of Admission'].dt.year.min(),
-                            max=df_healthcare['Date of Admission'].dt.year.max(),
-                            value=[df_healthcare['Date of Admission'].dt.year.min(), df_healthcare['Date of Admission'].dt.year.max()],
-                            marks={year: str(year) for year in range(df_healthcare['Date of Admission'].dt.year.min(), 
-                                                                      df_healthcare['Date of Admission'].dt.year.max() + 1)},
-                            step=1,
-                            tooltip={"placement": "bottom", "always_visible": True}
-                        )
-                    ]),
-                    width=12
-                )
-            ],
-            className="mb-2",
-            style={"backgroundColor": "black"}
-        ),
-
-        # Graphs: Admissions by Year and Avg Billing Amount
-        dbc.Row(
-            [
-                dbc.Col(
-                    dcc.Graph(id="admissions-per-year-bar-chart",
-                              config={"displayModeBar": False}),
-                    width=6
-                ),
-                dbc.Col(
-                    dcc.Graph(id="avg-billing-line-chart",
-                              config={"displayModeBar": False}),
-                    width=6
-                )
-            ],
-            className="mb-4"
-        ),
-
-        # Interactive Table
-        dbc.Row(
-            [
-                dbc.Col(
-                    html.Div([
-                        html.H4("Patient Details", className="text-center", style={"color": "#0d6efd"}),
-                        DataTable(
-                            id="patient-details-table",
-                            columns=[{"name": col, "id": col} for col in ["Name", "Age", "Gender", "Medical Condition", "Billing Amount"]],
-                            data=df_healthcare.to_dict('records'),
-                            style_table={'height': '300px', 'overflowY': 'auto'},
-                            style_header={'backgroundColor': '#0d6efd', 'color': 'white'},
-                            style_cell={
-                                'backgroundColor': 'black',
-                                'color': 'white',
-                                'textAlign': 'center',
-                            },
-                        )
-                    ])
-                )
-            ],
-            className="mb-4"
-        )
-    ],
-    fluid=True
-)
 
-# Callbacks for Graphs
-@dash.callback(
-    Output("admissions-per-year-bar-chart", "figure"),
-    Output("avg-billing-line-chart", "figure"),
-    Input("year-range-slider", "value")
-)
-def update_graphs(year_range):
-    # Filter data by year range
-    filtered_df = df_healthcare[(df_healthcare['Date of Admission'].dt.year >= year_range[0]) & 
-                                (df_healthcare['Date of Admission'].dt.year <= year_range[1])]
+def layout(**kwargs):
+    # Metrics and the slider range come from the incrementally maintained
+    # aggregates, so the page reflects appended admissions on the next visit
+    aggregates = get_aggregates()
+    first_year = aggregates.year_cube.first_year
+    last_year = aggregates.year_cube.last_year
+
+    return dbc.Container(
+        [
+            dbc.Row(
+                [
+                    dbc.Col(html.Div([
+                        html.H1("Health Care Overview", className="text-center", style={"color": "#0d6efd", "margin-bottom": "20px"})
+                    ]), width=12)
+                ],
+                className="mb-4",
+                style={"backgroundColor": "black"},
+            ),
+
+            # Metric Overview
+            dbc.Row(
+                [
+                    dbc.Col(html.Div([
+                        html.H2(f"{aggregates.rows}", className="text-center", style={"color": "#0d6efd"}),
+                        html.P("Total Admissions", className="text-center", style={"color": "white"})
+                    ]), width=3, className="p-3", style={"backgroundColor": "#000"}),
+
+                    dbc.Col(html.Div([
+                        html.H2(f"{round(aggregates.avg_length_of_stay, 1)} Days", className="text-center", style={"color": "#0d6efd"}),
+                        html.P("Avg Length of Stay", className="text-center", style={"color": "white"})
+                    ]), width=3, className="p-3", style={"backgroundColor": "#000"}),
+
+                    dbc.Col(html.Div([
+                        html.H2(f"{aggregates.most_common_condition}", className="text-center", style={"color": "#0d6efd"}),
+                        html.P("Most Common Condition", className="text-center", style={"color": "white"})
+                    ]), width=3, className="p-3", style={"backgroundColor": "#000"}),
+
+                    dbc.Col(html.Div([
+                        html.H2(f"${round(aggregates.avg_billing, 2)}", className="text-center", style={"color": "#0d6efd"}),
+                        html.P("Avg Billing Amount (USD)", className="text-center", style={"color": "white"})
+                    ]), width=3, className="p-3", style={"backgroundColor": "#000"}),
+                ],
+                justify="center",
+                className="mb-4"
+            ),
+
+            # Per-year totals and chart templates for the clientside year filter
+            dcc.Store(id="year-totals-store", data=year_totals_store() if CLIENTSIDE_FILTERING else None),
+
+            # Year Range Slider
+            dbc.Row(
+                [
+                    dbc.Col(
+                        html.Div([
+                            html.Label("Select Year Range for Analysis:", style={"color": "#0d6efd", "font-size": "16px"}),
+                            dcc.RangeSlider(
+                                id="year-range-slider",
+                                min=first_year,
+                                max=last_year,
+                                value=[first_year, last_year],
+                                marks={year: str(year) for year in range(first_year, last_year + 1)},
+                                step=1,
+                                tooltip={"placement": "bottom", "always_visible": True}
+                            )
+                        ]),
+                        width=12
+                    )
+                ],
+                className="mb-2",
+                style={"backgroundColor": "black"}
+            ),
+
+            # Graphs: Admissions by Year and Avg Billing Amount
+            dbc.Row(
+                [
+                    dbc.Col(
+                        dcc.Graph(id="admissions-per-year-bar-chart",
+                                  config={"displayModeBar": False}),
+                        width=6
+                    ),
+                    dbc.Col(
+                        dcc.Graph(id="avg-billing-line-chart",
+                                  config={"displayModeBar": False}),
+                        width=6
+                    )
+                ],
+                className="mb-4"
+            ),
 
+            # Interactive Table
+            dbc.Row(
+                [
+                    dbc.Col(
+                        html.Div([
+                            html.H4("Patient Details", className="text-center", style={"color": "#0d6efd"}),
+                            DataTable(
+                                id="patient-details-table",
+                                columns=[{"name": col, "id": col, "type": "numeric" if col in numeric_columns else "text"}
+                                         for col in table_columns],
+                                page_current=0,
+                                page_size=TABLE_PAGE_SIZE,
+                                page_action='custom',
+                                sort_action='custom',
+                                sort_mode='single',
+                                sort_by=[],
+                                filter_action='custom',
+                                filter_query='',
+                                style_table={'height': '300px', 'overflowY': 'auto'},
+                                style_header={'backgroundColor': '#0d6efd', 'color': 'white'},
+                                style_cell={
+                                    'backgroundColor': 'black',
+                                    'color': 'white',
+                                    'textAlign': 'center',
+                                },
+                            )
+                        ])
+                    )
+                ],
+                className="mb-4"
+            )
+        ],
+        fluid=True
+    )
+
+
+def year_figures(years, admissions_per_year, avg_billing_per_year):
     # Bar chart: Admissions per Year
-    admissions_per_year = filtered_df['Date of Admission'].dt.year.value_counts().sort_index()
     fig_bar = go.Figure(go.Bar(
-        x=admissions_per_year.index.astype(str),
-        y=admissions_per_year.values,
+        x=years,
+        y=admissions_per_year,
         marker_color="#0d6efd"
     ))
     fig_bar.update_layout(
@@ -181,10 +198,9 @@ def update_graphs(year_range):
     )
 
     # Line chart: Avg Billing Amount
-    avg_billing_per_year = filtered_df.groupby(filtered_df['Date of Admission'].dt.year)['Billing Amount'].mean()
     fig_line = go.Figure(go.Scatter(
-        x=avg_billing_per_year.index.astype(str),
-        y=avg_billing_per_year.values,
+        x=years,
+        y=avg_billing_per_year,
         mode='lines+markers',
         line=dict(color="#0d6efd", width=2),
         marker=dict(size=6, color="#0d6efd", symbol='circle')
@@ -201,3 +217,55 @@ def update_graphs(year_range):
     )
 
     return fig_bar, fig_line
+
+
+def year_totals_store():
+    # Every year's admission count and billing sum/count, plus the two figures
+    # without data; the clientside callback filters the years and fills them in
+    cube = get_aggregates().year_cube
+    fig_bar, fig_line = year_figures([], [], [])
+    return {
+        "years": cube.years.tolist(),
+        "counts": cube.counts.tolist(),
+        "billing_sums": cube.billing_sums.tolist(),
+        "billing_counts": cube.billing_counts.tolist(),
+        "bar": fig_bar.to_plotly_json(),
+        "line": fig_line.to_plotly_json(),
+    }
+
+
+@cached_callback
+def update_graphs(year_range):
+    # Per-year totals for the selected range come from the precomputed year cube
+    years, admissions_per_year, avg_billing_per_year = get_aggregates().year_cube.per_year(year_range[0], year_range[1])
+    return year_figures(years.astype(str), admissions_per_year, avg_billing_per_year)
+
+
+# Callbacks for Graphs
+if CLIENTSIDE_FILTERING:
+    dash.clientside_callback(
+        ClientsideFunction(namespace="overview", function_name="updateGraphs"),
+        Output("admissions-per-year-bar-chart", "figure"),
+        Output("avg-billing-line-chart", "figure"),
+        Input("year-range-slider", "value"),
+        Input("year-totals-store", "data")
+    )
+else:
+    dash.callback(
+        Output("admissions-per-year-bar-chart", "figure"),
+        Output("avg-billing-line-chart", "figure"),
+        Input("year-range-slider", "value")
+    )(update_graphs)
+
+
+# Callback for the Patient Details table: only the visible page is sent to the browser
+@dash.callback(
+    Output("patient-details-table", "data"),
+    Output("patient-details-table", "page_count"),
+    Input("patient-details-table", "page_current"),
+    Input("patient-details-table", "page_size"),
+    Input("patient-details-table", "sort_by"),
+    Input("patient-details-table", "filter_query")
+)
+def update_patient_table(page_current, page_size, sort_by, filter_query):
+    return get_patient_table().page(page_current, page_size, sort_by, filter_query)
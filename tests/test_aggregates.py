@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from healthcare import dataset
+from healthcare.aggregates import MonthlyPartitions, YearCube
+
+DATA = 'assets/data.csv'
+
+
+def random_frame(rng, rows):
+    # Admissions over a few years, with some missing dates and billing amounts
+    dates = pd.Series(pd.to_datetime('2015-01-01') + pd.to_timedelta(rng.integers(0, 365 * 8, rows), unit='D'))
+    dates[rng.random(rows) < 0.05] = pd.NaT
+    billing = pd.Series(rng.normal(25000, 12000, rows).round(2))
+    billing[rng.random(rows) < 0.1] = np.nan
+    return pd.DataFrame({'Date of Admission': dates, 'Billing Amount': billing})
+
+
+def pandas_per_year(df, start, end):
+    # The overview page's original computation, filtering the rows on every call
+    filtered_df = df[(df['Date of Admission'].dt.year >= start) & (df['Date of Admission'].dt.year <= end)]
+    admissions_per_year = filtered_df['Date of Admission'].dt.year.value_counts().sort_index()
+    avg_billing_per_year = filtered_df.groupby(filtered_df['Date of Admission'].dt.year)['Billing Amount'].mean()
+    return filtered_df, admissions_per_year, avg_billing_per_year
+
+
+@pytest.mark.parametrize('seed', range(200))
+def test_year_cube_matches_pandas(seed):
+    rng = np.random.default_rng(seed)
+    df = random_frame(rng, int(rng.integers(0, 400)))
+    cube = YearCube.from_frame(df)
+
+    # Ranges inside, overlapping and entirely outside the data, including empty ones
+    for start, end in [(2015, 2022), (2010, 2030), (2017, 2019), (2018, 2018), (2000, 2005), (2030, 2040),
+                       (2020, 2016), tuple(sorted(rng.integers(2012, 2026, 2)))]:
+        filtered_df, admissions_per_year, avg_billing_per_year = pandas_per_year(df, start, end)
+
+        years, counts, avg_billing = cube.per_year(start, end)
+        np.testing.assert_array_equal(years, admissions_per_year.index.to_numpy())
+        np.testing.assert_array_equal(counts, admissions_per_year.to_numpy())
+        np.testing.assert_allclose(avg_billing, avg_billing_per_year.reindex(years).to_numpy(), rtol=1e-9)
+
+        admissions, billing_sum, billing_count = cube.totals(start, end)
+        assert admissions == len(filtered_df)
+        assert billing_count == filtered_df['Billing Amount'].count()
+        assert billing_sum == pytest.approx(filtered_df['Billing Amount'].sum(), rel=1e-9, abs=1e-6)
+
+
+
+def pandas_correlation(df, months, first_month, last_month):
+    # The medical condition page's original computation over the month range
+    selected = df[(months >= first_month) & (months <= last_month)]
+    selected = selected[selected['Billing Amount'] >= 0][MonthlyPartitions.CORRELATION_COLUMNS].copy()
+    selected['Medical Condition'] = pd.factorize(selected['Medical Condition'])[0]
+    return selected.corr()
+
+
+@pytest.mark.parametrize('shift, scale', [(0.0, 1.0), (1e9, 1e-3)])
+def test_monthly_correlation_matches_pandas(shift, scale):
+    # Billing amounts far from zero relative to their spread are where raw
+    # sums of squares lose their digits
+    df = dataset.read_source(DATA)
+    df['Billing Amount'] = shift + df['Billing Amount'] * scale
+    partitions = MonthlyPartitions.from_frame(df.iloc[:100])
+    for start in range(100, len(df), 100):
+        partitions = partitions.merge(MonthlyPartitions.from_frame(df.iloc[start:start + 100]), start)
+
+    months = dataset.month_number(df['Date of Admission'])
+    ranges = [(months.min(), months.max()), tuple(partitions.months[[5, 40]])]
+    for first_month, last_month in ranges:
+        expected = pandas_correlation(df, months, first_month, last_month)
+        got = partitions.correlation(first_month, last_month)
+        np.testing.assert_allclose(got.to_numpy(), expected.to_numpy(), atol=1e-7)
@@ -0,0 +1,27 @@
+import json
+
+import plotly.graph_objects as go
+from dash import _callback
+from plotly.io.json import to_json_plotly
+
+from healthcare import figure_cache
+from healthcare.figure_cache import SerializedOutput, cached_callback, install_figure_cache
+
+
+@cached_callback
+def two_figures(n):
+    return go.Figure(go.Bar(x=list(range(n)), y=[i * 1.5 for i in range(n)])), go.Figure(go.Scatter(y=[n, None]))
+
+
+def test_hits_reach_the_response_as_stored():
+    install_figure_cache(None)
+    figure_cache.figure_cache.clear()
+    first, second = two_figures(12), two_figures(12)
+    assert first is second
+    assert all(isinstance(output, SerializedOutput) for output in first)
+
+    response = {"multi": True, "response": {"bar": {"figure": first[0]}, "line": {"figure": first[1]}}}
+    spliced = _callback.to_json(response)
+    assert first[0].payload in spliced and first[1].payload in spliced
+    # Any other encoder decodes the outputs instead
+    assert json.loads(spliced) == json.loads(to_json_plotly(response))
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from healthcare.histogram import BinnedDistribution
+
+
+def searched_counts(values, edges):
+    # The per-edge binary search the cumulative grid replaces
+    return np.diff(np.searchsorted(values, edges, side='left'))
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_grid_counts_match_binary_search(seed):
+    rng = np.random.default_rng(seed)
+    rows = int(rng.integers(1, 5000))
+    # Whole numbers (like ages) and cents (like billing amounts), with gaps
+    values = rng.integers(18, 90, rows).astype(float) if seed % 2 else rng.uniform(-500, 52000, rows).round(2)
+    values[rng.random(rows) < 0.05] = np.nan
+    groups = rng.choice(['Male', 'Female'], rows)
+    distribution = BinnedDistribution(values, groups)
+
+    present = values[~np.isnan(values)]
+    uppers = [None, np.nanmin(values) + 3, *rng.uniform(np.nanmin(values), np.nanmax(values), 10)]
+    for group in [None, 'Male', 'Female', 'Other']:
+        for upper in uppers:
+            for bins in (10, 50, 400):
+                edges = distribution.edges(group, upper, bins)
+                expected = searched_counts(distribution.sorted_values(group, upper), edges)
+                np.testing.assert_array_equal(distribution.counts(edges, group, upper), expected)
+                if group is None and upper is None:
+                    assert distribution.counts(edges).sum() == len(present)
@@ -0,0 +1,65 @@
+import base64
+import json
+import os
+import shutil
+import subprocess
+
+import numpy as np
+import pytest
+from plotly.io.json import to_json_plotly
+
+import app  # noqa: F401  registers the pages
+from pages import overview
+
+OVERVIEW_JS = os.path.join(os.path.dirname(__file__), os.pardir, "assets", "overview.js")
+
+# Runs the browser callback on the ranges read from stdin, with a bare
+# window object standing in for the one Dash provides
+HARNESS = """
+global.window = {};
+require(process.argv[1]);
+const input = JSON.parse(require('fs').readFileSync(0, 'utf8'));
+const updateGraphs = window.dash_clientside.overview.updateGraphs;
+process.stdout.write(JSON.stringify(input.ranges.map(range => updateGraphs(range, input.store))));
+"""
+
+
+def run_clientside(ranges, store):
+    result = subprocess.run(
+        ["node", "-e", HARNESS, os.path.abspath(OVERVIEW_JS)],
+        input=to_json_plotly({"ranges": ranges, "store": store}), capture_output=True, text=True, check=True)
+    return json.loads(result.stdout)
+
+
+def plain(value):
+    # Figure data with typed arrays decoded back into lists
+    if isinstance(value, dict):
+        if "bdata" in value:
+            return np.frombuffer(base64.b64decode(value["bdata"]), dtype=value["dtype"]).tolist()
+        return {key: plain(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [plain(item) for item in value]
+    return value
+
+
+def numbers(values):
+    return np.array([np.nan if value is None else value for value in values], dtype=float)
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="needs Node.js to run assets/overview.js")
+def test_clientside_year_charts_match_update_graphs():
+    cube = overview.get_aggregates().year_cube
+    first, last = int(cube.first_year), int(cube.last_year)
+    ranges = [[first, last], [first + 1, last - 1], [first, first], [last + 1, last + 5], [last, first]]
+    clientside = run_clientside(ranges, overview.year_totals_store())
+
+    for year_range, browser_figures in zip(ranges, clientside):
+        server_figures = plain(json.loads(to_json_plotly(overview.update_graphs(year_range))))
+        for server, browser in zip(server_figures, browser_figures):
+            server_trace, browser_trace = server["data"][0], browser["data"][0]
+            assert [str(x) for x in server_trace["x"]] == browser_trace["x"]
+            # The server rounds averages to display precision (cents)
+            np.testing.assert_allclose(numbers(browser_trace["y"]), numbers(server_trace["y"]), atol=0.005)
+            without_data = {key: value for key, value in server_trace.items() if key not in ("x", "y")}
+            assert without_data == {key: value for key, value in browser_trace.items() if key not in ("x", "y")}
+            assert server["layout"] == browser["layout"]
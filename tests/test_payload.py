@@ -0,0 +1,14 @@
+import numpy as np
+
+from healthcare.payload import compact_array
+
+
+def test_missing_values_stay_null_in_matrices():
+    # A correlation heatmap's z has NaN cells where a pair has no spread
+    z = np.array([[1.0, np.nan, 0.25, -0.5], [np.nan, 1.0, 0.125, 0.75]])
+    assert compact_array(z) == [[1.0, None, 0.25, -0.5], [None, 1.0, 0.125, 0.75]]
+
+
+def test_missing_values_stay_null_in_arrays():
+    values = np.array([1.0, np.nan, 2.5, 3.0, 4.0, 5.0, 6.0, 7.123456])
+    assert compact_array(values) == [1.0, None, 2.5, 3.0, 4.0, 5.0, 6.0, 7.123]
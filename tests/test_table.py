@@ -0,0 +1,88 @@
+import pytest
+
+from healthcare.dataset import read_source
+from healthcare.store import SQLiteStore, StorePatientTable, ingest
+from healthcare.table import PatientTable, split_filter_part
+
+DATA = "assets/data.csv"
+COLUMNS = ["Name", "Age", "Gender", "Medical Condition", "Billing Amount"]
+
+# Filter strings as DataTable sends them: operators carry an "s" (its default,
+# case-sensitive) or "i" prefix, or none when typed as words
+QUERIES = [
+    "{Gender} s= Female",
+    "{Gender} ieq female",
+    "{Age} s>= 60",
+    "{Age} s< 30 && {Gender} s= Male",
+    "{Age} ge 40 && {Age} le 50",
+    "{Name} scontains Le",
+    "{Name} icontains le",
+    '{Name} contains "Michelle Cruz"',
+    "{Medical Condition} s!= Cancer",
+    "{Medical Condition} icontains DIAB",
+    "{Billing Amount} s> 40000",
+]
+
+
+@pytest.mark.parametrize('filter_part, expected', [
+    ("{Age} s= 30", ("Age", "eq", 30.0)),
+    ("{Age} s>= 30", ("Age", "ge", 30.0)),
+    ("{Age} s> 30", ("Age", "gt", 30.0)),
+    ("{Age} ge 30", ("Age", "ge", 30.0)),
+    ("{Name} scontains Le", ("Name", "contains", "Le")),
+    ("{Name} icontains le", ("Name", "icontains", "le")),
+    ("{Gender} ieq 'male'", ("Gender", "ieq", "male")),
+    ("{Date of Admission} sdatestartswith 2023", ("Date of Admission", "datestartswith", 2023.0)),
+    ('{Name} contains "Michelle Cruz"', ("Name", "contains", "Michelle Cruz")),
+    ('{Name} scontains "Paige Lee"', ("Name", "contains", "Paige Lee")),
+    ("{Name} sfoo x", (None, None, None)),
+    ("Name contains x", (None, None, None)),
+])
+def test_split_filter_part(filter_part, expected):
+    assert split_filter_part(filter_part) == expected
+
+
+@pytest.fixture(scope="module")
+def frame():
+    return read_source(DATA)
+
+
+@pytest.fixture(scope="module")
+def store(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("store") / "healthcare.sqlite3")
+    ingest(DATA, path)
+    return SQLiteStore(path)
+
+
+def brute_force(df, filter_query):
+    # The rows each query should select, written out with plain pandas
+    df = df[COLUMNS]
+    masks = {
+        "{Gender} s= Female": df["Gender"] == "Female",
+        "{Gender} ieq female": df["Gender"].str.lower() == "female",
+        "{Age} s>= 60": df["Age"] >= 60,
+        "{Age} s< 30 && {Gender} s= Male": (df["Age"] < 30) & (df["Gender"] == "Male"),
+        "{Age} ge 40 && {Age} le 50": df["Age"].between(40, 50),
+        "{Name} scontains Le": df["Name"].str.contains("Le", regex=False),
+        "{Name} icontains le": df["Name"].str.lower().str.contains("le", regex=False),
+        '{Name} contains "Michelle Cruz"': df["Name"].str.contains("Michelle Cruz", regex=False),
+        "{Medical Condition} s!= Cancer": df["Medical Condition"] != "Cancer",
+        "{Medical Condition} icontains DIAB": df["Medical Condition"].str.lower().str.contains("diab"),
+        "{Billing Amount} s> 40000": df["Billing Amount"] > 40000,
+    }
+    return df[masks[filter_query].to_numpy(dtype=bool)]
+
+
+@pytest.mark.parametrize('filter_query', QUERIES)
+def test_page_applies_datatable_filters(frame, store, filter_query):
+    expected = brute_force(frame, filter_query)
+    assert 0 < len(expected) < len(frame)
+    page_size = len(frame)
+    for table in (PatientTable(frame, COLUMNS), StorePatientTable(store, COLUMNS)):
+        records, page_count = table.page(0, page_size, None, filter_query)
+        assert page_count == 1
+        assert [record["Name"] for record in records] == expected["Name"].tolist()
+
+        _, filtered_pages = table.page(0, 5, None, filter_query)
+        _, all_pages = table.page(0, 5, None, "")
+        assert filtered_pages < all_pages
@@ -0,0 +1,9 @@
+# WSGI entry point for production servers: `gunicorn -c gunicorn.conf.py`
+# (see gunicorn.conf.py). The dataset and page figures are built on import,
+# which gunicorn does once in the master process before forking workers.
+from app import app
+from healthcare.serving import preload
+
+preload()
+
+server = app.server